@@ -2,17 +2,43 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import io
+import csv
 import json
+import hashlib
+import click
+import base64
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from collections import Counter
 import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from jinja2 import FileSystemBytecodeCache
+from babel import Locale
+from babel.dates import LC_TIME, parse_pattern
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, g, session, jsonify, \
+    stream_with_context, has_request_context, has_app_context
+from functools import wraps, lru_cache
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
+from sqlalchemy import event
+from search_index import TrigramIndex
+from intervals import IntervalIndex
+from cache import create_cache, create_fragment_cache
+from fragments import FragmentCacheExtension
+from snapshot import Snapshot, BackgroundTask
+import geo
+from geo import Gazetteer
+from dbpool import engine_options, install_statement_timeout, pool_snapshot
+from replicas import RoutingSQLAlchemy, ReplicaRouter
+from serialization import dumps
+import metrics
+from importer import guess_format, decode_lines, read_rows, validate_row
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 import sys
 #----------------------------------------------------------------------------#
 # App Config.
@@ -21,8 +47,16 @@ import sys
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+db = RoutingSQLAlchemy(app)
 migrate = Migrate(app, db)
+replicas = ReplicaRouter(app)
+with app.app_context():
+    for engine in [db.engine] + replicas.engines:
+        install_statement_timeout(engine, app.config)
+        geo.install_sqlite_functions(engine)
+        metrics.instrument_engine(engine)
+metrics.instrument_app(app)
 
 # connect to a local postgresql database
 
@@ -30,12 +64,14 @@ migrate = Migrate(app, db)
 # Models.
 #----------------------------------------------------------------------------#
 
+# Genres are a Postgres ARRAY; other dialects (SQLite for local runs) store JSON.
+GenreList = db.ARRAY(db.String).with_variant(db.JSON, 'sqlite')
 
 class Venue(db.Model):
     __tablename__ = 'venues'
 
     id = db.Column(db.Integer, primary_key=True, nullable=False)
-    genres = db.Column(db.ARRAY(db.String))
+    genres = db.Column(GenreList)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
@@ -46,9 +82,25 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(200))
+    # Set by the geocode-venues command; geohash indexes the point, see geo.py.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(geo.PRECISION))
+    # Denormalized from shows; see count_new_show() and refresh_show_counters().
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped on any change to what the detail page shows; see page_validators().
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now,
+                           server_default=db.func.now())
 
     shows_venue = db.relationship('Show', backref='venue', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_venues_state_city', 'state', 'city'),
+        db.Index('ix_venues_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_venues_geohash', 'geohash'),
+    )
+
     # implement any missing fields, as a database migration using Flask-Migrate
 
 
@@ -60,14 +112,24 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String))
+    genres = db.Column(GenreList)
     image_link = db.Column(db.String(500))
     website = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(200))
+    # Denormalized from shows; see count_new_show() and refresh_show_counters().
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped on any change to what the detail page shows; see page_validators().
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now,
+                           server_default=db.func.now())
     shows_artists = db.relationship('Show', backref='artist', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_artists_genres', 'genres', postgresql_using='gin'),
+    )
+
     # implement any missing fields, as a database migration using Flask-Migrate
 
 
@@ -78,6 +140,56 @@ class Show(db.Model):
     venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    duration_minutes = db.Column(db.Integer, nullable=False, default=DEFAULT_SHOW_MINUTES,
+                                 server_default=str(DEFAULT_SHOW_MINUTES))
+
+    # On Postgres, exclusion constraints (see migration 25fa23e53b02) also
+    # reject overlapping shows at one venue or by one artist; see
+    # booking_conflicts() for the check made before inserting.
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+        db.CheckConstraint('duration_minutes > 0 AND duration_minutes <= {}'.format(MAX_SHOW_MINUTES),
+                           name='ck_shows_duration_minutes'),
+    )
+
+class VenueDirectoryEntry(db.Model):
+    # One row per city/state area: its venues as a JSON list in directory
+    # order. On Postgres this is the `venue_directory` materialized view from
+    # the migrations; elsewhere db.create_all() makes it a plain table. Either
+    # way it is rebuilt by refresh_venue_directory().
+    __tablename__ = 'venue_directory'
+    __table_args__ = {'info': {'materialized_view': True}}
+
+    state = db.Column(db.String(120), primary_key=True)
+    city = db.Column(db.String(120), primary_key=True)
+    venues = db.Column(db.JSON, nullable=False)
+
+
+class TableVersion(db.Model):
+    # A counter per table, bumped by writes made through the app (see
+    # bump_versions()), so a listing is validated by primary key lookups
+    # rather than by scanning the table it lists.
+    __tablename__ = 'table_versions'
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, server_default=db.func.now())
+
+
+VERSIONED_TABLES = ('venues', 'artists', 'shows')
+# Listings built from more than their own table. The venue directory is
+# versioned by refresh_venue_directory(), so until a refresh after a write
+# commits, the listing keeps the validators of the directory it shows.
+LISTING_VERSIONS = {'venues': ('venues', 'venue_directory'), 'shows': ('shows', 'venues', 'artists')}
+
+
+@event.listens_for(TableVersion.__table__, 'after_create')
+def create_table_versions(target, connection, **kw):
+    # The migrations insert these rows; this covers db.create_all().
+    connection.execute(target.insert(), [{"name": name, "version": 0, "updated_at": datetime.now()}
+                                         for name in VERSIONED_TABLES + ('venue_directory',)])
 
 # Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
@@ -86,17 +198,1110 @@ class Show(db.Model):
 #----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=64)
+def _datetime_pattern(format, locale):
+    # Compiled Babel pattern and parsed locale, per (format, locale).
+    return parse_pattern(DATETIME_FORMATS.get(format, format)), Locale.parse(locale)
+
+
+@lru_cache(maxsize=app.config['DATETIME_CACHE_SIZE'])
+def _format_datetime(value, format, locale):
+    pattern, locale = _datetime_pattern(format, locale)
+    return pattern.apply(value, locale)
+
+
+def format_datetime(value, format='medium', locale=LC_TIME):
+    # Accepts datetimes as well as strings; listing pages repeat the same
+    # start times, so formatted results are cached too.
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    return _format_datetime(value, format, locale)
 
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+# Rows rendered through {% cache %} blocks (per-row partials such as
+# pages/show_card.html) are rendered once per version; see fragments.py.
+app.jinja_env.add_extension(FragmentCacheExtension)
+app.jinja_env.fragment_cache = create_fragment_cache(app.config)
+if app.config['TEMPLATE_BYTECODE_CACHE']:
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_BYTECODE_CACHE_DIR'])
+
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+
+def venue_listing_query():
+    # Every venue with its upcoming show count, in directory order, from the
+    # venues table alone (reading the denormalized counters).
+    return db.session.query(
+        Venue.city,
+        Venue.state,
+        Venue.id,
+        Venue.name,
+        Venue.upcoming_shows_count.label('num_upcoming_shows')
+    ).order_by(Venue.state, Venue.city, Venue.name, Venue.id)
+
+
+def group_venue_directory(rows):
+    # Groups the ordered listing rows by area.
+    areas = []
+    for (city, state), venues_in_area in groupby(rows, key=lambda row: (row.city, row.state)):
+        areas.append({
+            "city": city,
+            "state": state,
+            "venues": [{
+                "id": venue.id,
+                "name": venue.name,
+                "num_upcoming_shows": venue.num_upcoming_shows
+            } for venue in venues_in_area]
+        })
+
+    return areas
+
+
+def venue_directory_query():
+    # The city -> venues -> upcoming show count directory, one precomputed
+    # row per area; see refresh_venue_directory().
+    return db.session.query(
+        VenueDirectoryEntry.city,
+        VenueDirectoryEntry.state,
+        VenueDirectoryEntry.venues
+    ).order_by(VenueDirectoryEntry.state, VenueDirectoryEntry.city)
+
+
+def directory_areas(rows):
+    return [{"city": row.city, "state": row.state, "venues": row.venues} for row in rows]
+
+
+def venue_directory(genres=()):
+    # Filtered listings are grouped from the venues table directly.
+    if genres:
+        return group_venue_directory(venue_listing_query().filter(genre_filter(Venue, genres)))
+    return directory_areas(venue_directory_query())
+
+
+def refresh_venue_directory():
+    # Rebuilds the directory, after writes by way of venue_directory_refresh
+    # and directly after bulk loads. Postgres refreshes
+    # the materialized view concurrently, so readers see the old rows until
+    # the new ones commit, along with the directory's new version; elsewhere
+    # the fallback table is rewritten. A failed
+    # refresh leaves the directory stale until the next one (see the
+    # refresh-venue-directory command) rather than failing the write.
+    try:
+        if using_postgres():
+            db.session.execute('REFRESH MATERIALIZED VIEW CONCURRENTLY venue_directory')
+        else:
+            db.session.query(VenueDirectoryEntry).delete()
+            areas = group_venue_directory(venue_listing_query())
+            if areas:
+                db.session.execute(VenueDirectoryEntry.__table__.insert(), areas)
+        bump_versions('venue_directory')
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        app.logger.exception('Refreshing the venue directory failed')
+        return False
+    return True
+
+
+def _encode_cursor(values):
+    payload = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor, keys):
+    # Returns None for a malformed cursor, which callers treat as the first page.
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(keys):
+            return None
+        values = [datetime.fromisoformat(value) if isinstance(key.type, db.DateTime) else value
+                  for key, value in zip(keys, values)]
+    except (ValueError, TypeError):
+        return None
+    # Anything else would be bound as a query parameter as is.
+    if not all(value is None or isinstance(value, (str, int, float, datetime)) for value in values):
+        return None
+    return values
+
+
+def page_size(limit=None):
+    if limit is None:
+        return app.config['PAGE_SIZE']
+    return max(1, min(limit, app.config['MAX_PAGE_SIZE']))
+
+
+def keyset_page(query, keys, after=None, before=None, limit=None):
+    # Seek pagination over a unique, ordered tuple of columns. Rather than an
+    # OFFSET, each page filters on the row value of the boundary row, so the
+    # cost of a page is independent of how deep into the listing it is.
+    # One extra row is fetched to tell whether another page exists.
+    limit = page_size(limit)
+    key = db.tuple_(*keys)
+    after = _decode_cursor(after, keys) if after else None
+    before = _decode_cursor(before, keys) if before else None
+
+    def cursor(row):
+        return _encode_cursor([getattr(row, column.key) for column in keys])
+
+    if before is not None:
+        rows = query.filter(key < db.tuple_(*before)) \
+            .order_by(*[column.desc() for column in keys]) \
+            .limit(limit + 1) \
+            .all()
+        has_more = len(rows) > limit
+        rows = rows[:limit][::-1]
+        prev_cursor = cursor(rows[0]) if has_more else None
+        next_cursor = cursor(rows[-1]) if rows else None
+    else:
+        if after is not None:
+            query = query.filter(key > db.tuple_(*after))
+        rows = query.order_by(*keys).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = cursor(rows[-1]) if has_more else None
+        prev_cursor = cursor(rows[0]) if after is not None and rows else None
+
+    return {
+        "items": rows,
+        "limit": limit,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor
+    }
+
+
+def show_feed_query():
+    return db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Venue.updated_at.label('venue_updated_at'),
+        Artist.updated_at.label('artist_updated_at')
+    ).join(Venue, Venue.id == Show.venue_id).join(Artist, Artist.id == Show.artist_id)
+
+
+def show_feed_item(show):
+    return {
+        "venue_id": show.venue_id,
+        "venue_name": show.venue_name,
+        "artist_id": show.artist_id,
+        "artist_name": show.artist_name,
+        "artist_image_link": show.artist_image_link,
+        "start_time": show.start_time
+    }
+
+
+def show_card(show):
+    # A feed item as rendered by pages/show_card.html: shows are never
+    # edited, so the card only changes along with its venue or artist.
+    return dict(show_feed_item(show), id=show.id, version='{}/{}'.format(
+        show.venue_updated_at.timestamp(), show.artist_updated_at.timestamp()))
+
+
+def show_feed_page(after=None, before=None, limit=None, item=show_feed_item):
+    page = keyset_page(show_feed_query(), [Show.start_time, Show.id], after=after, before=before, limit=limit)
+    page["items"] = [item(show) for show in page["items"]]
+    return page
+
+
+def home_highlights():
+    # The home page lists: upcoming shows within HIGHLIGHTS_WINDOW_DAYS ranked
+    # by how busy their artist and venue are (the denormalized counters), and
+    # the most recently listed venues and artists. Built by the `highlights`
+    # snapshot, in the background unless the database is in-memory SQLite.
+    now = datetime.now()
+    limit = app.config['HIGHLIGHTS_LIMIT']
+    shows = show_feed_query() \
+        .filter(Show.start_time > now, Show.start_time <= now + timedelta(days=app.config['HIGHLIGHTS_WINDOW_DAYS'])) \
+        .order_by((Artist.upcoming_shows_count + Venue.upcoming_shows_count).desc(), Show.start_time, Show.id) \
+        .limit(limit)
+    venues = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state) \
+        .order_by(Venue.id.desc()).limit(limit)
+    artists = db.session.query(Artist.id, Artist.name, Artist.city, Artist.state) \
+        .order_by(Artist.id.desc()).limit(limit)
+
+    return {
+        "shows": [show_card(show) for show in shows],
+        "venues": [row._asdict() for row in venues],
+        "artists": [row._asdict() for row in artists]
+    }
+
+
+EXPORT_FIELDS = ('show_id', 'start_time', 'venue_id', 'venue_name', 'city', 'state', 'artist_id', 'artist_name')
+
+
+def show_export_rows(start=None, end=None, city=None, state=None):
+    # Every matching show joined to its venue and artist, in start time
+    # order, read through a server side cursor in batches so memory use does
+    # not depend on the size of the table.
+    query = db.session.query(
+        Show.id.label('show_id'),
+        Show.start_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Venue.city,
+        Venue.state,
+        Show.artist_id,
+        Artist.name.label('artist_name')
+    ).join(Venue, Venue.id == Show.venue_id).join(Artist, Artist.id == Show.artist_id)
+    if start is not None:
+        query = query.filter(Show.start_time >= start)
+    if end is not None:
+        query = query.filter(Show.start_time < end)
+    if city:
+        query = query.filter(Venue.city == city)
+    if state:
+        query = query.filter(Venue.state == state)
+    return query.order_by(Show.start_time, Show.id) \
+        .execution_options(stream_results=True) \
+        .yield_per(app.config['EXPORT_BATCH_SIZE'])
+
+
+def export_lines(rows, format):
+    # Serializes export rows one line at a time as NDJSON or CSV.
+    if format == 'ndjson':
+        for row in rows:
+            yield dumps({field: getattr(row, field) for field in EXPORT_FIELDS}) + b'\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow([getattr(row, field) for field in EXPORT_FIELDS])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def entity_list_page(model, fields, after=None, before=None, limit=None, genres=()):
+    # Keyset page of venues or artists ordered by (name, id), loading only
+    # the requested columns (plus the ordering key needed for cursors), and
+    # only rows having every one of `genres`.
+    keys = [model.name, model.id]
+    columns = [getattr(model, field) for field in fields]
+    columns += [key for key in keys if key.key not in fields]
+
+    query = db.session.query(*columns)
+    if genres:
+        query = query.filter(genre_filter(model, genres))
+    page = keyset_page(query, keys, after=after, before=before, limit=limit)
+    page["items"] = [{field: getattr(row, field) for field in fields} for row in page["items"]]
+    return page
+
+
+def artist_list_page(after=None, before=None, limit=None, genres=()):
+    return entity_list_page(Artist, ['id', 'name'], after=after, before=before, limit=limit, genres=genres)
+
+
+def using_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def genre_values(model):
+    # A FROM clause yielding each genre of a `model` row, and its column:
+    # unnest() over the Postgres arrays, json_each() over the JSON fallback.
+    if using_postgres():
+        return db.func.unnest(model.genres).alias('genre'), db.literal_column('genre')
+    return db.func.json_each(model.genres).alias('genre'), db.literal_column('genre.value')
+
+
+def genre_filter(model, genres):
+    # Rows having every one of `genres`; array containment on Postgres, which
+    # the GIN index on genres answers.
+    if using_postgres():
+        return model.genres.op('@>')(db.cast(list(genres), postgresql.ARRAY(db.String)))
+    conditions = []
+    for genre in genres:
+        values, value = genre_values(model)
+        conditions.append(db.exists(db.select([db.literal(1)]).select_from(values).where(value == genre)))
+    return db.and_(*conditions)
+
+
+def genre_facet_query(model, *criteria):
+    # Per genre row counts over the `model` rows matching `criteria`, in one
+    # GROUP BY over the unnested genres, most common first.
+    values, value = genre_values(model)
+    return db.session.query(value.label('genre'), db.func.count().label('count')) \
+        .select_from(model, values) \
+        .filter(*criteria) \
+        .group_by(value) \
+        .order_by(db.desc('count'), value)
+
+
+def facet_list(rows, selected):
+    return [{"genre": genre, "count": count, "selected": genre in selected} for genre, count in rows]
+
+
+def genre_facets(model, selected, *criteria):
+    # The facet list for a listing or search narrowed to the `selected`
+    # genres: the genres of the remaining rows with their counts.
+    if selected:
+        criteria += (genre_filter(model, selected),)
+    return facet_list(genre_facet_query(model, *criteria), selected)
+
+
+def search_document(model):
+    # The text searched for a venue or artist. On Postgres this must stay the
+    # exact expression the trigram GIN indexes are built on, see migrations
+    # ec94f9574d88 and 6830fd090a15, or the planner falls back to a
+    # sequential scan.
+    genres = db.func.fyyur_genres_text(model.genres)
+    return db.func.fyyur_search_text(model.name, model.city, model.state, genres)
+
+
+# In-process trigram indexes standing in for pg_trgm on other databases,
+# along with each row's genres for filtering and faceting the matches.
+# They are built lazily and dropped whenever a venue or artist is written.
+_search_fallback = {}
+
+
+def _fallback_index(model):
+    entry = _search_fallback.get(model)
+    if entry is None:
+        index, genres = TrigramIndex(), {}
+        for row in db.session.query(model.id, model.name, model.city, model.state, model.genres):
+            index.add(row.id, row.name, row.city, row.state, ' '.join(row.genres or []))
+            genres[row.id] = frozenset(row.genres or ())
+        entry = _search_fallback[model] = (index, genres)
+    return entry
+
+
+def _expire_search_fallback(mapper, connection, target):
+    _search_fallback.pop(mapper.class_, None)
+
+
+for model in (Venue, Artist):
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, event_name, _expire_search_fallback)
+
+
+def _fallback_matches(model, term, genres=()):
+    # Ids of the rows matching `term` and having every one of `genres`, best
+    # first, from the in-process index.
+    index, row_genres = _fallback_index(model)
+    ids = index.search(term)
+    if genres:
+        genres = frozenset(genres)
+        ids = [id for id in ids if genres <= row_genres[id]]
+    return ids
+
+
+def search_entities(model, term, limit=None, genres=()):
+    # Case-insensitive partial match on name, city, state and genres,
+    # most relevant first: closest name by trigram similarity, then by name.
+    # Returns at most `limit` (id, name, upcoming_shows_count) hits along with
+    # the total number of matches and whether that total is only a lower bound.
+    term = term.strip().lower()
+    limit = limit or app.config['SEARCH_RESULT_LIMIT']
+    if using_postgres():
+        matches = db.session.query(model.id, model.name, model.upcoming_shows_count) \
+            .filter(search_document(model).contains(term, autoescape=True))
+        if genres:
+            matches = matches.filter(genre_filter(model, genres))
+        hits = matches \
+            .order_by(db.func.similarity(db.func.lower(model.name), term).desc(), model.name, model.id) \
+            .limit(limit) \
+            .all()
+        if len(hits) < limit:
+            return hits, len(hits), False
+        # Count no further than SEARCH_COUNT_LIMIT so a broad term stays cheap.
+        count_limit = app.config['SEARCH_COUNT_LIMIT']
+        total = db.session.query(db.func.count()) \
+            .select_from(matches.limit(count_limit + 1).subquery()) \
+            .scalar()
+        return hits, min(total, count_limit), total > count_limit
+
+    ids = _fallback_matches(model, term, genres)
+    top = ids[:limit]
+    rows = {row.id: row for row in db.session.query(model.id, model.name, model.upcoming_shows_count)
+            .filter(model.id.in_(top))} if top else {}
+    return [rows[id] for id in top if id in rows], len(ids), False
+
+
+def search_facets(model, term, genres=()):
+    # Genre facets over the search matches for `term`, as genre_facets().
+    term = term.strip().lower()
+    if using_postgres():
+        return genre_facets(model, genres, search_document(model).contains(term, autoescape=True))
+    row_genres = _fallback_index(model)[1]
+    counts = Counter()
+    for id in _fallback_matches(model, term, genres):
+        counts.update(row_genres[id])
+    return facet_list(sorted(counts.items(), key=lambda item: (-item[1], item[0])), genres)
+
+
+def search_results(model, term, genres=()):
+    hits, total, estimated = search_entities(model, term, genres=genres)
+
+    return {
+        "count": total,
+        "estimated": estimated,
+        "data": [{
+            "id": hit.id,
+            "name": hit.name,
+            "num_upcoming_shows": hit.upcoming_shows_count
+        } for hit in hits],
+        "facets": search_facets(model, term, genres)
+    }
+
+
+def count_new_show(show):
+    # Bumps the counters (and so updated_at) of the show's venue and artist
+    # within the caller's transaction.
+    if show.start_time > datetime.now():
+        counter = 'upcoming_shows_count'
+    else:
+        counter = 'past_shows_count'
+    for model, id in ((Venue, show.venue_id), (Artist, show.artist_id)):
+        column = getattr(model, counter)
+        db.session.query(model).filter(model.id == id) \
+            .update({column: column + 1}, synchronize_session=False)
+
+
+def touch(model, ids):
+    # Marks rows as changed when a row they display changes, e.g. the venues
+    # an edited artist has played at, so their validators change too.
+    db.session.query(model).filter(model.id.in_(ids)) \
+        .update({model.updated_at: datetime.now()}, synchronize_session=False)
+    bump_versions(model.__tablename__)
+
+
+def bump_versions(*names):
+    # Marks tables as changed within the caller's transaction, so the
+    # validators of their listings change; see version_query().
+    db.session.query(TableVersion).filter(TableVersion.name.in_(names)) \
+        .update({TableVersion.version: TableVersion.version + 1, TableVersion.updated_at: datetime.now()},
+                synchronize_session=False)
+
+
+def version_query(model, id=None):
+    # The (last_modified, key) pair a page's validators are derived from: the
+    # row itself for a detail page, the table's table_versions row for a
+    # listing. Versions only grow, so their sum identifies the state too.
+    if id is not None:
+        return db.session.query(model.updated_at, model.id).filter(model.id == id)
+    return db.session.query(db.func.max(TableVersion.updated_at), db.func.sum(TableVersion.version)) \
+        .filter(TableVersion.name.in_(LISTING_VERSIONS.get(model.__tablename__, [model.__tablename__])))
+
+
+def make_validators(model, version):
+    # Returns an (etag, last_modified) pair from a version_query() row, or
+    # None when the row does not exist.
+    last_modified, key = version or (None, None)
+    if last_modified is None:
+        return None
+    version = '{}:{}:{}'.format(model.__tablename__, key, last_modified.isoformat())
+    return hashlib.md5(version.encode()).hexdigest(), last_modified.astimezone(timezone.utc)
+
+
+def page_validators(model, id=None):
+    # Validators for a detail page, or for the whole listing when no id is
+    # given, from one indexed lookup.
+    return make_validators(model, version_query(model, id).first())
+
+
+def refresh_show_counters(since=None):
+    # Recomputes the denormalized show counters from the shows table and
+    # returns how many venue and artist rows were out of date. Shows roll from
+    # upcoming to past as time passes, so with `since` only rows having a show
+    # that started after it are rechecked; being a recomputation, overlapping
+    # windows are harmless.
+    now = datetime.now()
+    changed = 0
+    for model, column in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+        upcoming = db.session.query(db.func.count(Show.id)) \
+            .filter(column == model.id, Show.start_time > now) \
+            .label('upcoming')
+        past = db.session.query(db.func.count(Show.id)) \
+            .filter(column == model.id, Show.start_time <= now) \
+            .label('past')
+        stale = db.session.query(model).filter(db.or_(
+            model.upcoming_shows_count != upcoming,
+            model.past_shows_count != past
+        ))
+        if since is not None:
+            stale = stale.filter(model.id.in_(
+                db.session.query(column).filter(Show.start_time > since, Show.start_time <= now)
+            ))
+        changed += stale.update({
+            model.upcoming_shows_count: upcoming,
+            model.past_shows_count: past
+        }, synchronize_session=False)
+    db.session.commit()
+    return changed
+
+
+def _import_artists(batch):
+    # Upserts on the unique artist name so re-running an import is
+    # idempotent. Returns (inserted, updated).
+    table = Artist.__table__
+    rows = {}
+    for values in batch:
+        rows[values['name']] = dict(values, updated_at=datetime.now())
+    existing = {name for name, in db.session.query(Artist.name).filter(Artist.name.in_(rows))}
+
+    if using_postgres():
+        insert = postgresql.insert(table)
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={column: insert.excluded[column] for column in next(iter(rows.values())) if column != 'name'}
+        ), list(rows.values()))
+    else:
+        inserts = [values for name, values in rows.items() if name not in existing]
+        updates = [dict(values, match_name=name) for name, values in rows.items() if name in existing]
+        if inserts:
+            db.session.execute(table.insert(), inserts)
+        if updates:
+            db.session.execute(
+                table.update().where(table.c.name == db.bindparam('match_name')),
+                updates
+            )
+    return len(rows) - len(existing), len(existing)
+
+
+def naive_local(value):
+    # Show times are stored as naive local time; input with an offset (e.g.
+    # a trailing Z) is converted to it so it compares with datetime.now().
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def show_end(start_time, duration_minutes):
+    return start_time + timedelta(minutes=duration_minutes)
+
+
+def booking_index(venue_ids, artist_ids, start, end):
+    # An IntervalIndex of the booked shows of the given venues and artists
+    # that could overlap [start, end), keyed by ('venue', id) and
+    # ('artist', id). Shows are at most MAX_SHOW_MINUTES long, so only shows
+    # starting that much before `start` need loading.
+    index = IntervalIndex()
+    if not venue_ids and not artist_ids:
+        return index
+    rows = db.session.query(Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.duration_minutes) \
+        .filter(db.or_(Show.venue_id.in_(venue_ids), Show.artist_id.in_(artist_ids)),
+                Show.start_time > start - timedelta(minutes=MAX_SHOW_MINUTES),
+                Show.start_time < end)
+    for row in rows:
+        end_time = show_end(row.start_time, row.duration_minutes)
+        label = 'show {}'.format(row.id)
+        index.add(('venue', row.venue_id), row.start_time, end_time, label)
+        index.add(('artist', row.artist_id), row.start_time, end_time, label)
+    return index
+
+
+def booking_conflicts(index, venue_id, artist_id, start, end):
+    # Form style errors for a proposed show that overlaps a booking in the
+    # index at the same venue or by the same artist.
+    errors = {}
+    clash = index.first_overlap(('venue', venue_id), start, end)
+    if clash is not None:
+        errors['venue_id'] = ['The venue is already booked at that time ({}).'.format(clash)]
+    clash = index.first_overlap(('artist', artist_id), start, end)
+    if clash is not None:
+        errors['artist_id'] = ['The artist is already booked at that time ({}).'.format(clash)]
+    return errors
+
+
+# The exclusion constraints of migration 25fa23e53b02, by name.
+BOOKING_CONSTRAINTS = {
+    'ex_shows_venue_booking': ('venue_id', 'The venue is already booked at that time.'),
+    'ex_shows_artist_booking': ('artist_id', 'The artist is already booked at that time.'),
+}
+
+
+def constraint_conflicts(error):
+    # Errors as booking_conflicts() for an insert the exclusion constraints
+    # rejected, e.g. when another request booked the slot after the check;
+    # {} when `error` is some other integrity error.
+    name = getattr(getattr(error.orig, 'diag', None), 'constraint_name', None)
+    if name not in BOOKING_CONSTRAINTS:
+        return {}
+    field, message = BOOKING_CONSTRAINTS[name]
+    return {field: [message]}
+
+
+def show_end_column():
+    # SQL for a show's end time.
+    if using_postgres():
+        return Show.start_time + Show.duration_minutes * db.literal_column("interval '1 minute'", db.Interval)
+    return db.func.datetime(Show.start_time, '+' + db.cast(Show.duration_minutes, db.String) + ' minutes',
+                            type_=db.DateTime)
+
+
+def available_venues(city, state, start, end, genres=(), limit=None):
+    # Venues in an area with no show overlapping [start, end), best genre
+    # match first. The NOT EXISTS anti-join probes ix_shows_venue_id_start_time
+    # once per venue of the area (found via ix_venues_state_city): a show
+    # lasts at most MAX_SHOW_MINUTES, so only shows starting in
+    # (start - MAX_SHOW_MINUTES, end) can overlap and the exact end time is
+    # only checked on those. Postgres ranks and limits in SQL; elsewhere the
+    # JSON genres are matched in Python.
+    booked = db.session.query(Show.id).filter(
+        Show.venue_id == Venue.id,
+        Show.start_time > start - timedelta(minutes=MAX_SHOW_MINUTES),
+        Show.start_time < end,
+        show_end_column() > start
+    )
+    venues = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.address,
+                              Venue.genres, Venue.image_link) \
+        .filter(Venue.state == state, Venue.city == city, ~booked.exists())
+    genres = list(genres)
+    limit = page_size(limit)
+
+    if using_postgres():
+        matches = db.literal(0)
+        if genres:
+            genre = db.func.unnest(Venue.genres).alias('genre')
+            matches = db.select([db.func.count()]).select_from(genre) \
+                .where(db.column('genre').in_(genres)).as_scalar()
+        rows = venues.add_columns(matches.label('genre_matches')) \
+            .order_by(db.desc('genre_matches'), Venue.name, Venue.id) \
+            .limit(limit)
+        return [row._asdict() for row in rows]
+
+    rows = [dict(row._asdict(), genre_matches=len(set(row.genres or ()) & set(genres))) for row in venues]
+    rows.sort(key=lambda row: (-row['genre_matches'], row['name'], row['id']))
+    return rows[:limit]
+
+
+def within_radius(latitude, longitude, radius_km):
+    # The distance of a venue from a point, and criteria selecting venues
+    # within `radius_km` of it: range scans of ix_venues_geohash over the
+    # cells covering the circle, then the exact distance on those rows only.
+    distance = db.func.fyyur_distance_km(Venue.latitude, Venue.longitude, latitude, longitude, type_=db.Float)
+    cells = [Venue.geohash.between(*geo.prefix_range(prefix))
+             for prefix in geo.covering_prefixes(latitude, longitude, radius_km)]
+    return distance, [db.or_(*cells), distance <= radius_km]
+
+
+def nearby_venues(latitude, longitude, radius_km, limit=None):
+    # The `limit` venues nearest to a point within `radius_km`, nearest
+    # first. The search starts from a small circle and widens it until it
+    # holds `limit` venues, which are then the nearest overall, so a dense
+    # area never reads the candidates of the whole radius.
+    limit = page_size(limit)
+    search_km = min(radius_km, max(radius_km / 64, 1.0))
+    while True:
+        distance, criteria = within_radius(latitude, longitude, search_km)
+        rows = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.address,
+                                Venue.latitude, Venue.longitude, Venue.image_link,
+                                distance.label('distance_km')) \
+            .filter(*criteria) \
+            .order_by(distance, Venue.id) \
+            .limit(limit) \
+            .all()
+        if len(rows) == limit or search_km >= radius_km:
+            return [dict(row._asdict(), distance_km=round(row.distance_km, 3)) for row in rows]
+        search_km = min(search_km * 4, radius_km)
+
+
+def nearby_show_page(latitude, longitude, radius_km, after=None, before=None, limit=None):
+    # Upcoming shows at venues within `radius_km` of a point, soonest first.
+    distance, criteria = within_radius(latitude, longitude, radius_km)
+    query = show_feed_query() \
+        .add_columns(distance.label('distance_km')) \
+        .filter(Show.start_time > datetime.now(), *criteria)
+    page = keyset_page(query, [Show.start_time, Show.id], after=after, before=before, limit=limit)
+    page["items"] = [dict(show_feed_item(show), distance_km=round(show.distance_km, 3)) for show in page["items"]]
+    return page
+
+
+def geocode_venues(gazetteer, everything=False):
+    # Places venues not located yet (or all of them) at their city's
+    # centroid, a batch at a time. Returns how many were located and the
+    # venue counts of the (city, state) pairs the gazetteer does not know.
+    located, unknown = 0, Counter()
+    last_id = 0
+    while True:
+        query = db.session.query(Venue.id, Venue.city, Venue.state).filter(Venue.id > last_id)
+        if not everything:
+            query = query.filter(Venue.geohash.is_(None))
+        rows = query.order_by(Venue.id).limit(app.config['IMPORT_BATCH_SIZE']).all()
+        if not rows:
+            return located, unknown
+        last_id = rows[-1].id
+
+        updates = []
+        for row in rows:
+            point = gazetteer.locate(row.city, row.state)
+            if point is None:
+                unknown[(row.city, row.state)] += 1
+                continue
+            updates.append({"id": row.id, "latitude": point[0], "longitude": point[1],
+                            "geohash": geo.encode(*point)})
+        db.session.bulk_update_mappings(Venue, updates)
+        db.session.commit()
+        located += len(updates)
+
+
+def _import_shows(batch):
+    # Rejects shows whose venue or artist does not exist, or that overlap a
+    # booked show or an earlier row of the batch, before inserting, so one
+    # bad row does not fail the whole batch. Returns per-line errors.
+    venue_ids = {values['venue_id'] for _, values in batch}
+    artist_ids = {values['artist_id'] for _, values in batch}
+    venue_ids = {id for id, in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+    artist_ids = {id for id, in db.session.query(Artist.id).filter(Artist.id.in_(artist_ids))}
+    bookings = booking_index(venue_ids, artist_ids,
+                             min(values['start_time'] for _, values in batch),
+                             max(show_end(values['start_time'], values['duration_minutes']) for _, values in batch))
+
+    errors = []
+    rows = []
+    for line, values in batch:
+        if values['venue_id'] not in venue_ids:
+            errors.append({"line": line, "errors": {"venue_id": ['No such venue.']}})
+            continue
+        if values['artist_id'] not in artist_ids:
+            errors.append({"line": line, "errors": {"artist_id": ['No such artist.']}})
+            continue
+        start, end = values['start_time'], show_end(values['start_time'], values['duration_minutes'])
+        conflicts = booking_conflicts(bookings, values['venue_id'], values['artist_id'], start, end)
+        if conflicts:
+            errors.append({"line": line, "errors": conflicts})
+            continue
+        label = 'line {}'.format(line)
+        bookings.add(('venue', values['venue_id']), start, end, label)
+        bookings.add(('artist', values['artist_id']), start, end, label)
+        rows.append(values)
+    if rows:
+        db.session.execute(Show.__table__.insert(), rows)
+    return len(rows), errors
+
+
+def bulk_import(kind, rows):
+    # Validates (line, row) pairs with the create forms and writes the valid
+    # ones in executemany batches of IMPORT_BATCH_SIZE, one transaction per
+    # batch. Invalid rows are skipped and reported by line number.
+    report = {"inserted": 0, "updated": 0, "errors": []}
+    batch_size = app.config['IMPORT_BATCH_SIZE']
+
+    def flush(batch):
+        try:
+            if kind == 'artists':
+                inserted, updated = _import_artists([values for _, values in batch])
+                report['updated'] += updated
+            elif kind == 'shows':
+                inserted, errors = _import_shows(batch)
+                report['errors'].extend(errors)
+            else:
+                db.session.execute(Venue.__table__.insert(), [values for _, values in batch])
+                inserted = len(batch)
+            db.session.commit()
+            report['inserted'] += inserted
+        except SQLAlchemyError as error:
+            db.session.rollback()
+            report['errors'].extend({"line": line, "errors": {"batch": [str(getattr(error, 'orig', None) or error)]}}
+                                    for line, _ in batch)
+
+    batch = []
+    for line, row in rows:
+        values, errors = validate_row(kind, row)
+        if errors:
+            report['errors'].append({"line": line, "errors": errors})
+            continue
+        batch.append((line, values))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    # Core inserts bypass the ORM events, so bring derived data up to date.
+    if kind == 'shows':
+        refresh_show_counters()
+    bump_versions(*(VERSIONED_TABLES if kind == 'shows' else (kind,)))
+    db.session.commit()
+    refresh_venue_directory()
+    _search_fallback.clear()
+    page_cache.clear()
+    highlights.refresh()
+    report['errors'].sort(key=lambda error: error['line'])
+    return report
+
+
+def _split_shows(shows, now):
+    # Partitions (show, counterpart) pairs around a single `now` snapshot so
+    # past and upcoming lists (and their counts) always agree with each other.
+    past_shows = []
+    upcoming_shows = []
+    for show, entry in shows:
+        if show.start_time > now:
+            upcoming_shows.append(entry)
+        else:
+            past_shows.append(entry)
+    return past_shows, upcoming_shows
+
+
+def venue_page(venue, past_shows, upcoming_shows):
+    return {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": venue.genres,
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+        "past_shows": past_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows": upcoming_shows,
+        "upcoming_shows_count": len(upcoming_shows)
+    }
+
+
+def venue_show_entries(venue_id):
+    # A venue's shows as detail page entries, oldest first. Used where the
+    # venue row is fetched separately (see asgi.py and _api_detail()).
+    return db.session.query(
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.start_time
+    ).join(Show, Show.artist_id == Artist.id) \
+        .filter(Show.venue_id == venue_id) \
+        .order_by(Show.start_time)
+
+
+def venue_detail(venue_id):
+    # Loads a venue together with every show and its artist in one query.
+    rows = db.session.query(Venue, Show, Artist) \
+        .outerjoin(Show, Show.venue_id == Venue.id) \
+        .outerjoin(Artist, Artist.id == Show.artist_id) \
+        .filter(Venue.id == venue_id) \
+        .order_by(Show.start_time) \
+        .all()
+    if not rows:
+        return None
+
+    past_shows, upcoming_shows = _split_shows([(show, {
+        "artist_id": artist.id,
+        "artist_name": artist.name,
+        "artist_image_link": artist.image_link,
+        "start_time": show.start_time
+    }) for _, show, artist in rows if show is not None], datetime.now())
+
+    return venue_page(rows[0][0], past_shows, upcoming_shows)
+
+
+def artist_page(artist, past_shows, upcoming_shows):
+    return {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": artist.genres,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link,
+        "past_shows": past_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows": upcoming_shows,
+        "upcoming_shows_count": len(upcoming_shows)
+    }
+
+
+def artist_show_entries(artist_id):
+    # An artist's shows as detail page entries, oldest first.
+    return db.session.query(
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link'),
+        Show.start_time
+    ).join(Show, Show.venue_id == Venue.id) \
+        .filter(Show.artist_id == artist_id) \
+        .order_by(Show.start_time)
+
+
+def artist_detail(artist_id):
+    # Loads an artist together with every show and its venue in one query.
+    rows = db.session.query(Artist, Show, Venue) \
+        .outerjoin(Show, Show.artist_id == Artist.id) \
+        .outerjoin(Venue, Venue.id == Show.venue_id) \
+        .filter(Artist.id == artist_id) \
+        .order_by(Show.start_time) \
+        .all()
+    if not rows:
+        return None
+
+    past_shows, upcoming_shows = _split_shows([(show, {
+        "venue_id": venue.id,
+        "venue_name": venue.name,
+        "venue_image_link": venue.image_link,
+        "start_time": show.start_time
+    }) for _, show, venue in rows if show is not None], datetime.now())
+
+    return artist_page(rows[0][0], past_shows, upcoming_shows)
+
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+page_cache = create_cache(app.config)
+
+
+def tag_page(*tags):
+    # Names the rows the page being rendered was built from. Only tagged
+    # pages are cached, so error and not-found branches never are.
+    g.setdefault('cache_tags', set()).update(tags)
+
+
+def entities_changed(*tags):
+    # Called after a successful write with the tags of every row it touched.
+    bump_versions(*[tag for tag in tags if tag in VERSIONED_TABLES])
+    db.session.commit()
+    if 'venues' in tags:
+        # Requests leave the refresh to the background; a CLI command would
+        # exit before it ran, so outside a request it is done here.
+        if has_request_context() and not in_memory_database():
+            venue_directory_refresh.trigger()
+        else:
+            refresh_venue_directory()
+    page_cache.invalidate(*tags)
+    highlights.refresh()
+
+
+def in_memory_database():
+    # An in-memory SQLite database is private to the thread that opened it,
+    # so background threads cannot refresh it.
+    url = db.engine.url
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def _refresh_venue_directory():
+    with app.app_context():
+        if refresh_venue_directory():
+            page_cache.invalidate('venues')
+
+
+venue_directory_refresh = BackgroundTask(_refresh_venue_directory, app.config['VENUE_DIRECTORY_REFRESH_DELAY'])
+
+
+def _build_highlights():
+    # Inline builds run within the request; the thread needs its own context.
+    if has_app_context():
+        return home_highlights()
+    with app.app_context():
+        return home_highlights()
+
+
+highlights = Snapshot(_build_highlights, app.config['HIGHLIGHTS_REFRESH_SECONDS'], inline=in_memory_database())
+
+
+def cached_html(entry, etag=None):
+    # A page is stored with the ETag it was rendered under (see
+    # conditional_page()) and is only served for that same ETag, so a page
+    # rendered before a write that has not been invalidated yet is a miss
+    # rather than old HTML sent with the new validators.
+    if entry is None:
+        return None
+    stored, _, html = entry.partition('\n')
+    return html if stored == (etag or '') else None
+
+
+def get_cached_page(key, etag=None):
+    return cached_html(page_cache.get(key), etag)
+
+
+def set_cached_page(key, etag, html, tags):
+    page_cache.set(key, (etag or '') + '\n' + html, tags=tags)
+
+
+def cached_page(view):
+    @wraps(view)
+    def wrapper(**kwargs):
+        # Pending flash messages are rendered into the page, so skip the cache.
+        if '_flashes' in session:
+            return view(**kwargs)
+        key = 'page:' + request.full_path
+        etag = g.get('page_etag')
+        html = get_cached_page(key, etag)
+        if html is None:
+            html = view(**kwargs)
+            tags = g.get('cache_tags')
+            if tags and isinstance(html, str) and not replicas.may_be_stale(page_cache.last_invalidated):
+                set_cached_page(key, etag, html, tags)
+        return html
+    return wrapper
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    if since is None:
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def conditional_page(model, id_arg=None):
+    # Answers If-None-Match / If-Modified-Since with a 304 from the row's
+    # validators alone, before the page is loaded or rendered.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            validators = None
+            if '_flashes' not in session:
+                validators = page_validators(model, kwargs.get(id_arg))
+            if validators is None:
+                return view(**kwargs)
+
+            etag, last_modified = validators
+            g.page_etag = etag
+            if _not_modified(etag, last_modified):
+                response = Response(status=304)
+            else:
+                response = app.make_response(view(**kwargs))
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+def versioned_page(model):
+    # For cached pages not answered conditionally, e.g. the show feed, which
+    # moves with the clock: keys the cached copy to the listing's version as
+    # conditional_page() does, so a write made by any process is a miss.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            validators = page_validators(model)
+            if validators is not None:
+                g.page_etag = validators[0]
+            return view(**kwargs)
+        return wrapper
+    return decorator
+
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -105,37 +1310,20 @@ app.jinja_env.filters['datetime'] = format_datetime
 
 @app.route('/')
 def index():
-    return render_template('pages/home.html')
+    # Served from the in-memory snapshot; empty until its first build.
+    return render_template('pages/home.html', highlights=highlights.get())
 
 
 #  Venues
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@conditional_page(Venue)
+@cached_page
 def venues():
-    # replace with real venues data.
-    # num_shows should be aggregated based on number of upcoming shows per venue.
-
-    cities = db.session.query(Venue.city, Venue.state).distinct(Venue.city, Venue.state)
-    data = []
-
-    for city in cities:
-        venues_by_city = db.session.query(Venue.id, Venue.name).filter(Venue.city==city[0])
-        v = []
-        for venue in venues_by_city:
-            v.append({
-                "id": venue.id,
-                "name": venue.name,
-                "num_upcoming_shows": db.session.query(Show).filter(Show.venue_id == venue.id).filter(Show.start_time > datetime.now()).count()
-            })
-
-        data.append({
-            "city": city[0],
-            "state": city[1],
-            "venues": v
-        })
-
-    return render_template('pages/venues.html', areas=data)
+    genres = request.args.getlist('genre')
+    tag_page('venues')
+    return render_template('pages/venues.html', areas=venue_directory(genres), facets=genre_facets(Venue, genres))
 
 
 @app.route('/venues/search', methods=['POST'])
@@ -144,75 +1332,26 @@ def search_venues():
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
     search_term = request.form.get('search_term', '')
-    venues = db.session.query(Venue).filter(Venue.name.ilike(f'%{search_term}%'))
-    data = []
-
-    for venue in venues:
-        data.append({
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": db.session.query(Show).filter(Show.venue_id == venue.id).filter(Show.start_time > datetime.now()).count()
-        })
-
-    response = {
-        "count": len(data),
-        "data": data
-    }
+    response = search_results(Venue, search_term, request.form.getlist('genre'))
 
     return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 
 @app.route('/venues/<int:venue_id>')
+@conditional_page(Venue, 'venue_id')
+@cached_page
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
-    # replace with real venue data from the venues table, using venue_id
-    try:
-        venue = Venue.query.get(venue_id)
-        past_shows = db.session.query(Show).filter(Show.venue_id == venue.id).filter(Show.start_time < datetime.now())
-        upcoming_shows = db.session.query(Show).filter(Show.venue_id == venue.id).filter(Show.start_time > datetime.now())
-
-        old_shows = []
-        for show in past_shows:
-            old_shows.append({
-                "artist_id": show.artist_id,
-                "artist_name": show.artist.name,
-                "artist_image_link": show.artist.image_link,
-                "start_time": str(show.start_time)
-            })
-
-        new_shows = []
-        for show in upcoming_shows:
-            new_shows.append({
-                "artist_id": show.artist_id,
-                "artist_name": show.artist.name,
-                "artist_image_link": show.artist.image_link,
-                "start_time": str(show.start_time)
-            })
-
-        data = {
-            "id": venue.id,
-            "name": venue.name,
-            "genres": venue.genres,
-            "address": venue.address,
-            "city": venue.city,
-            "state": venue.state,
-            "phone": venue.phone,
-            "website": venue.website,
-            "facebook_link": venue.facebook_link,
-            "seeking_talent": venue.seeking_talent,
-            "seeking_description": venue.seeking_description,
-            "image_link": venue.image_link,
-            "past_shows": old_shows,
-            "past_shows_count": past_shows.count(),
-            "upcoming_shows": new_shows,
-            "upcoming_shows_count": upcoming_shows.count()
-        }
-
-        return render_template('pages/show_venue.html', venue=data)
-    except:
+    data = venue_detail(venue_id)
+    if data is None:
         flash("Venue ID does not exist")
         return render_template('pages/home.html')
 
+    tag_page('venue:%d' % venue_id, *['artist:%d' % show['artist_id']
+                                      for show in data['past_shows'] + data['upcoming_shows']])
+
+    return render_template('pages/show_venue.html', venue=data)
+
 
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -254,6 +1393,7 @@ def create_venue_submission():
     finally:
         db.session.close()
     if not error:
+        entities_changed('venues')
         # on successful db insert, flash success
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
     else:
@@ -274,6 +1414,7 @@ def delete_venue(venue_id):
         ven_del = Venue.query.get(venue_id)
         db.session.delete(ven_del)
         db.session.commit()
+        entities_changed('venues', 'venue:%s' % venue_id)
     except:
         db.session.rollback()
     finally:
@@ -286,12 +1427,20 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@conditional_page(Artist)
+@cached_page
 def artists():
-    # replace with real data returned from querying the database
-
-    data = db.session.query(Artist)
+    genres = request.args.getlist('genre')
+    page = artist_list_page(
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        limit=request.args.get('limit', type=int),
+        genres=genres
+    )
+    tag_page('artists')
 
-    return render_template('pages/artists.html', artists=data)
+    return render_template('pages/artists.html', artists=page['items'], page=page,
+                           facets=genre_facets(Artist, genres))
 
 
 @app.route('/artists/search', methods=['POST'])
@@ -300,75 +1449,26 @@ def search_artists():
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
     search_term = request.form.get('search_term', '')
-    artists = db.session.query(Artist).filter(Artist.name.ilike(f'%{search_term}%'))
-    data = []
-
-    for artist in artists:
-        data.append({
-            "id": artist.id,
-            "name": artist.name,
-            "num_upcoming_shows": db.session.query(Show).filter(Show.artist_id == artist.id).filter(Show.start_time > datetime.now()).count()
-        })
-
-    response = {
-        "count": len(data),
-        "data": data
-    }
+    response = search_results(Artist, search_term, request.form.getlist('genre'))
 
     return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 
 @app.route('/artists/<int:artist_id>')
+@conditional_page(Artist, 'artist_id')
+@cached_page
 def show_artist(artist_id):
-    # shows the venue page with the given venue_id
-    # replace with real venue data from the venues table, using venue_id
-
-    try:
-        artist = Artist.query.get(artist_id)
-        past_shows = db.session.query(Show).filter(Show.artist_id == artist.id).filter(Show.start_time < datetime.now())
-        upcoming_shows = db.session.query(Show).filter(Show.artist_id == artist.id).filter(Show.start_time > datetime.now())
-
-        old_shows = []
-        for show in past_shows:
-            old_shows.append({
-                "venue_id": show.venue_id,
-                "venue_name": show.venue.name,
-                "venue_image_link": show.venue.image_link,
-                "start_time": str(show.start_time)
-            })
-
-        new_shows = []
-        for show in upcoming_shows:
-            new_shows.append({
-                "venue_id": show.venue_id,
-                "venue_name": show.venue.name,
-                "venue_image_link": show.venue.image_link,
-                "start_time": str(show.start_time)
-            })
-
-        data = {
-            "id": artist.id,
-            "name": artist.name,
-            "genres": artist.genres,
-            "city": artist.city,
-            "state": artist.state,
-            "phone": artist.phone,
-            "website": artist.website,
-            "facebook_link": artist.facebook_link,
-            "seeking_venue": artist.seeking_venue,
-            "seeking_description": artist.seeking_description,
-            "image_link": artist.image_link,
-            "past_shows": old_shows,
-            "past_shows_count": past_shows.count(),
-            "upcoming_shows": new_shows,
-            "upcoming_shows_count": upcoming_shows.count()
-        }
-
-        return render_template('pages/show_artist.html', artist=data)
-    except:
+    # shows the artist page with the given artist_id
+    data = artist_detail(artist_id)
+    if data is None:
         flash("Artist ID does not exist")
         return render_template('pages/home.html')
 
+    tag_page('artist:%d' % artist_id, *['venue:%d' % show['venue_id']
+                                        for show in data['past_shows'] + data['upcoming_shows']])
+
+    return render_template('pages/show_artist.html', artist=data)
+
 #  Update
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
@@ -401,19 +1501,18 @@ def edit_artist_submission(artist_id):
     error = False
 
     try:
-        artist = Artist(
-            name=request.form['name'],
-            city=request.form['city'],
-            state=request.form['state'],
-            phone=request.form['phone'],
-            genres=request.form.getlist('genres'),
-            image_link=request.form['image_link'],
-            website=request.form['website'],
-            facebook_link=request.form['facebook_link'],
-            seeking_venue=True if 'seeking_venue' in request.form else False,
-            seeking_description=request.form['seeking_description']
-        )
-        db.session.add(artist)
+        artist = Artist.query.get(artist_id)
+        artist.name = request.form['name']
+        artist.city = request.form['city']
+        artist.state = request.form['state']
+        artist.phone = request.form['phone']
+        artist.genres = request.form.getlist('genres')
+        artist.image_link = request.form['image_link']
+        artist.website = request.form['website']
+        artist.facebook_link = request.form['facebook_link']
+        artist.seeking_venue = True if 'seeking_venue' in request.form else False
+        artist.seeking_description = request.form['seeking_description']
+        touch(Venue, db.session.query(Show.venue_id).filter(Show.artist_id == artist_id))
         db.session.commit()
     except:
         error = True
@@ -422,7 +1521,8 @@ def edit_artist_submission(artist_id):
     finally:
         db.session.close()
     if not error:
-        # on successful db insert, flash success
+        entities_changed('artists', 'artist:%d' % artist_id)
+        # on successful db update, flash success
         flash('Artist ' + request.form['name'] + ' was successfully updated!')
     else:
         flash('An error occurred. Artist ' + request.form['name'] + ' could not be updated.')
@@ -461,21 +1561,22 @@ def edit_venue_submission(venue_id):
     error = False
 
     try:
-        venue = Venue(
-            name=request.form['name'],
-            city=request.form['city'],
-            genres=request.form.getlist('genres'),
-            state=request.form['state'],
-            address=request.form['address'],
-            phone=request.form['phone'],
-            website=request.form['website'],
-            image_link=request.form['image_link'],
-            facebook_link=request.form['facebook_link'],
-            seeking_talent=True if 'seeking_talent' in request.form else False,
-            seeking_description=request.form['seeking_description']
-        )
-
-        db.session.add(venue)
+        venue = Venue.query.get(venue_id)
+        if (venue.city, venue.state) != (request.form['city'], request.form['state']):
+            # Located in the old city; geocode-venues places it again.
+            venue.latitude = venue.longitude = venue.geohash = None
+        venue.name = request.form['name']
+        venue.city = request.form['city']
+        venue.genres = request.form.getlist('genres')
+        venue.state = request.form['state']
+        venue.address = request.form['address']
+        venue.phone = request.form['phone']
+        venue.website = request.form['website']
+        venue.image_link = request.form['image_link']
+        venue.facebook_link = request.form['facebook_link']
+        venue.seeking_talent = True if 'seeking_talent' in request.form else False
+        venue.seeking_description = request.form['seeking_description']
+        touch(Artist, db.session.query(Show.artist_id).filter(Show.venue_id == venue_id))
         db.session.commit()
     except:
         error = True
@@ -484,7 +1585,8 @@ def edit_venue_submission(venue_id):
     finally:
         db.session.close()
     if not error:
-        # on successful db insert, flash success
+        entities_changed('venues', 'venue:%d' % venue_id)
+        # on successful db update, flash success
         flash('Venue ' + request.form['name'] + ' was successfully updated!')
     else:
         # on unsuccessful db insert, flash an error instead.
@@ -531,6 +1633,7 @@ def create_artist_submission():
     finally:
         db.session.close()
     if not error:
+        entities_changed('artists')
         # on successful db insert, flash success
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
     else:
@@ -545,24 +1648,58 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@versioned_page(Show)
+@cached_page
 def shows():
-    # displays list of shows at /shows
-    # replace with real venues data.
-    # num_shows should be aggregated based on number of upcoming shows per venue.
-    showers = db.session.query(Show).join(Artist).join(Venue)
-    data = []
-
-    for show in showers:
-        data.append({
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "artist_id": show.artist_id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": str(show.start_time)
-        })
+    # displays list of shows at /shows, one keyset page at a time
+    page = show_feed_page(
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        limit=request.args.get('limit', type=int),
+        item=show_card
+    )
+    tag_page('shows', *['venue:%d' % show['venue_id'] for show in page['items']] +
+             ['artist:%d' % show['artist_id'] for show in page['items']])
+
+    return render_template('pages/shows.html', shows=page['items'], page=page)
+
 
-    return render_template('pages/shows.html', shows=data)
+@app.route('/import/<any(venues, artists, shows):kind>', methods=['POST'])
+def import_upload(kind):
+    # Bulk upload of a CSV or NDJSON file posted as `file`; responds with the
+    # import report, including per-line validation errors.
+    upload = request.files.get('file')
+    if upload is None:
+        return api_error('Upload a CSV or NDJSON file as "file"', 400)
+    format = request.args.get('format') or guess_format(upload.filename)
+    return api_response(bulk_import(kind, read_rows(decode_lines(upload.stream), format)))
+
+
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+@app.route('/shows/export')
+def export_shows():
+    # Streams the full shows calendar as NDJSON or CSV, optionally limited
+    # to a start/end date range and a city and state.
+    format = request.args.get('format', 'ndjson')
+    if format not in EXPORT_MIMETYPES:
+        return api_error('format must be ndjson or csv', 400)
+    try:
+        start = dateutil.parser.parse(request.args['start']) if request.args.get('start') else None
+        end = dateutil.parser.parse(request.args['end']) if request.args.get('end') else None
+    except (ValueError, OverflowError):
+        return api_error('start and end must be dates', 400)
+
+    rows = show_export_rows(start, end, request.args.get('city'), request.args.get('state'))
+    return Response(
+        stream_with_context(export_lines(rows, format)),
+        mimetype=EXPORT_MIMETYPES[format],
+        headers={'Content-Disposition': 'attachment; filename=shows.' + format}
+    )
 
 
 @app.route('/shows/create')
@@ -577,23 +1714,42 @@ def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
     # insert form data as a new Show record in the db, instead
     error = False
+    conflicts = {}
 
     try:
         show = Show(
-            venue_id=request.form['venue_id'],
-            artist_id=request.form['artist_id'],
-            start_time=request.form['start_time']
+            venue_id=int(request.form['venue_id']),
+            artist_id=int(request.form['artist_id']),
+            start_time=naive_local(dateutil.parser.parse(request.form['start_time'])),
+            duration_minutes=int(request.form.get('duration_minutes') or DEFAULT_SHOW_MINUTES)
         )
-        db.session.add(show)
-        db.session.commit()
-
+        if not 0 < show.duration_minutes <= MAX_SHOW_MINUTES:
+            raise ValueError('Show duration out of range')
+        end = show_end(show.start_time, show.duration_minutes)
+        bookings = booking_index([show.venue_id], [show.artist_id], show.start_time, end)
+        conflicts = booking_conflicts(bookings, show.venue_id, show.artist_id, show.start_time, end)
+        if not conflicts:
+            db.session.add(show)
+            count_new_show(show)
+            db.session.commit()
+
+    except IntegrityError as integrity_error:
+        db.session.rollback()
+        conflicts = constraint_conflicts(integrity_error)
+        error = not conflicts
+        print(sys.exc_info())
     except:
         error = True
         db.session.rollback()
         print(sys.exc_info())
     finally:
         db.session.close()
-    if not error:
+    if conflicts:
+        flash('Show could not be listed. ' + ' '.join(message for messages in conflicts.values()
+                                                      for message in messages))
+    elif not error:
+        entities_changed('shows', 'venues', 'venue:%s' % request.form['venue_id'],
+                         'artist:%s' % request.form['artist_id'])
         # on successful db insert, flash success
         flash('Show was successfully listed!')
     else:
@@ -603,6 +1759,410 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
+#  API
+#  ----------------------------------------------------------------
+
+API_FIELDS = {
+    Venue: ('id', 'name', 'genres', 'address', 'city', 'state', 'latitude', 'longitude', 'phone',
+            'website', 'facebook_link', 'seeking_talent', 'seeking_description', 'image_link',
+            'upcoming_shows_count', 'past_shows_count'),
+    Artist: ('id', 'name', 'genres', 'city', 'state', 'phone', 'website',
+             'facebook_link', 'seeking_venue', 'seeking_description', 'image_link',
+             'upcoming_shows_count', 'past_shows_count'),
+}
+# Fields of the detail endpoints, as venue_page() and artist_page() order
+# them, then the ones computed from the shows.
+API_DETAIL_FIELDS = {
+    Venue: ('id', 'name', 'genres', 'address', 'city', 'state', 'phone', 'website', 'facebook_link',
+            'seeking_talent', 'seeking_description', 'image_link'),
+    Artist: ('id', 'name', 'genres', 'city', 'state', 'phone', 'website', 'facebook_link',
+             'seeking_venue', 'seeking_description', 'image_link'),
+}
+API_SHOW_FIELDS = ('past_shows', 'past_shows_count', 'upcoming_shows', 'upcoming_shows_count')
+
+
+def api_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+def api_error(message, status):
+    return api_response({"error": message}, status)
+
+
+def requested_fields(allowed):
+    # Parses a sparse fieldset such as ?fields=id,name. Returns None when it
+    # names a field that does not exist.
+    fields = request.args.get('fields')
+    if not fields:
+        return list(allowed)
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    if not fields or any(field not in allowed for field in fields):
+        return None
+    return fields
+
+
+def stream_json(items, **meta):
+    # Writes {"data": [...], **meta} one item at a time, so the response
+    # starts flowing at once and is never held in memory as a whole.
+    def generate():
+        yield b'{"data":['
+        for index, item in enumerate(items):
+            yield (b',' if index else b'') + dumps(item)
+        yield b']'
+        for key, value in meta.items():
+            yield b',' + dumps(key) + b':' + dumps(value)
+        yield b'}'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def _api_entity_list(model):
+    fields = requested_fields(API_FIELDS[model])
+    if fields is None:
+        return api_error('Unknown field requested', 400)
+
+    if request.args.get('all') == 'true':
+        columns = [getattr(model, field) for field in fields]
+        rows = db.session.query(*columns).order_by(model.name, model.id).yield_per(1000)
+        return stream_json({field: getattr(row, field) for field in fields} for row in rows)
+
+    page = entity_list_page(
+        model, fields,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        limit=request.args.get('limit', type=int),
+        genres=request.args.getlist('genre')
+    )
+    return stream_json(page['items'], next_cursor=page['next_cursor'], prev_cursor=page['prev_cursor'])
+
+
+def _api_detail(model, id, show_column, show_entries):
+    # A venue or artist as its detail page has it, loading only the columns
+    # a sparse fieldset asks for: the shows are read only for the show
+    # fields, and only counted when the lists themselves are not wanted.
+    fields = requested_fields(API_DETAIL_FIELDS[model] + API_SHOW_FIELDS)
+    if fields is None:
+        return api_error('Unknown field requested', 400)
+    columns = [getattr(model, field) for field in fields if field in API_DETAIL_FIELDS[model]]
+    row = db.session.query(model.id, *columns).filter(model.id == id).first()
+    if row is None:
+        return api_error('Not found', 404)
+    data = row._asdict()
+
+    now = datetime.now()
+    if 'past_shows' in fields or 'upcoming_shows' in fields:
+        past_shows, upcoming_shows = _split_shows([(entry, entry._asdict()) for entry in show_entries(id)], now)
+        data.update(past_shows=past_shows, past_shows_count=len(past_shows),
+                    upcoming_shows=upcoming_shows, upcoming_shows_count=len(upcoming_shows))
+    elif 'past_shows_count' in fields or 'upcoming_shows_count' in fields:
+        upcoming = db.func.coalesce(db.func.sum(db.case([(Show.start_time > now, 1)], else_=0)), 0)
+        data['upcoming_shows_count'], total = db.session.query(upcoming, db.func.count(Show.id)) \
+            .filter(show_column == id).one()
+        data['past_shows_count'] = total - data['upcoming_shows_count']
+    return api_response({field: data[field] for field in fields})
+
+
+@app.route('/api/v1/venues')
+def api_venues():
+    return _api_entity_list(Venue)
+
+
+@app.route('/api/v1/venues/areas')
+def api_venue_areas():
+    return api_response({"data": venue_directory()})
+
+
+@app.route('/api/v1/venues/available')
+def api_available_venues():
+    try:
+        start = naive_local(dateutil.parser.parse(request.args['start']))
+        end = naive_local(dateutil.parser.parse(request.args['end']))
+    except (KeyError, ValueError, OverflowError):
+        return api_error('start and end must be ISO 8601 datetimes', 400)
+    if start >= end:
+        return api_error('start must be before end', 400)
+    if not request.args.get('city') or not request.args.get('state'):
+        return api_error('city and state are required', 400)
+    # ?genre= repeated, as on the other listings; a comma separated ?genres=
+    # is still read for existing clients.
+    genres = request.args.getlist('genre') + [genre.strip() for value in request.args.getlist('genres')
+                                              for genre in value.split(',') if genre.strip()]
+
+    venues = available_venues(request.args['city'], request.args['state'], start, end, genres,
+                              limit=request.args.get('limit', type=int))
+    return api_response({"data": venues})
+
+
+def near_arguments():
+    # (latitude, longitude, radius_km) from ?lat=&lon=&radius=, or None when
+    # they are missing or out of range.
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lon', type=float)
+    radius = request.args.get('radius', app.config['NEAR_RADIUS_KM'], type=float)
+    if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    if radius is None or not 0 < radius <= app.config['NEAR_MAX_RADIUS_KM']:
+        return None
+    return latitude, longitude, radius
+
+
+def near_error():
+    return api_error('lat and lon must be decimal degrees and radius at most {:g} km'.format(
+        app.config['NEAR_MAX_RADIUS_KM']), 400)
+
+
+@app.route('/api/v1/venues/near')
+def api_venues_near():
+    near = near_arguments()
+    if near is None:
+        return near_error()
+    return api_response({"data": nearby_venues(*near, limit=request.args.get('limit', type=int))})
+
+
+@app.route('/api/v1/venues/<int:venue_id>')
+def api_venue(venue_id):
+    return _api_detail(Venue, venue_id, Show.venue_id, venue_show_entries)
+
+
+@app.route('/api/v1/venues/search')
+def api_search_venues():
+    return api_response(search_results(Venue, request.args.get('q', ''), request.args.getlist('genre')))
+
+
+@app.route('/api/v1/artists')
+def api_artists():
+    return _api_entity_list(Artist)
+
+
+@app.route('/api/v1/artists/<int:artist_id>')
+def api_artist(artist_id):
+    return _api_detail(Artist, artist_id, Show.artist_id, artist_show_entries)
+
+
+@app.route('/api/v1/artists/search')
+def api_search_artists():
+    return api_response(search_results(Artist, request.args.get('q', ''), request.args.getlist('genre')))
+
+
+@app.route('/api/v1/shows')
+def api_shows():
+    if request.args.get('all') == 'true':
+        rows = show_feed_query().order_by(Show.start_time, Show.id).yield_per(1000)
+        return stream_json(show_feed_item(row) for row in rows)
+
+    page = show_feed_page(
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        limit=request.args.get('limit', type=int)
+    )
+    return stream_json(page['items'], next_cursor=page['next_cursor'], prev_cursor=page['prev_cursor'])
+
+
+@app.route('/api/v1/shows/near')
+def api_shows_near():
+    near = near_arguments()
+    if near is None:
+        return near_error()
+    page = nearby_show_page(
+        *near,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        limit=request.args.get('limit', type=int)
+    )
+    return stream_json(page['items'], next_cursor=page['next_cursor'], prev_cursor=page['prev_cursor'])
+
+
+#  Debug
+#  ----------------------------------------------------------------
+
+@app.route('/debug/pool')
+def pool_metrics():
+    snapshot = pool_snapshot(db.engine.pool)
+    if replicas.engines:
+        snapshot['replicas'] = [pool_snapshot(engine.pool) for engine in replicas.engines]
+    return jsonify(snapshot)
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    pool = pool_snapshot(db.engine.pool)
+    gauges = [('fyyur_db_pool_' + key, 'Connection pool ' + key.replace('_', ' ') + '.', value)
+              for key, value in sorted(pool.items()) if isinstance(value, (int, float))]
+    return Response(metrics.registry.render(gauges), mimetype='text/plain; version=0.0.4')
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+
+@app.cli.command('rollover-show-counters')
+@click.option('--window', default=120, show_default=True,
+              help='Recheck rows with shows that started within this many minutes.')
+def rollover_show_counters_command(window):
+    """Move shows that have started from the upcoming to the past counters.
+
+    Meant to run periodically (e.g. from cron) with a window comfortably
+    larger than the interval between runs.
+    """
+    changed = refresh_show_counters(since=datetime.now() - timedelta(minutes=window))
+    if changed:
+        entities_changed('venues')
+    click.echo('Rolled over show counters on {} rows.'.format(changed))
+
+
+@app.cli.command('rebuild-show-counters')
+def rebuild_show_counters_command():
+    """Rebuild every show counter from scratch and report drift."""
+    changed = refresh_show_counters()
+    if changed:
+        entities_changed('venues')
+    click.echo('Rebuilt show counters; {} rows were inconsistent.'.format(changed))
+
+
+@app.cli.command('refresh-venue-directory')
+def refresh_venue_directory_command():
+    """Rebuild the venues directory.
+
+    Writes made through the app refresh it already; run this periodically
+    (e.g. from cron) to pick up changes made to the database directly.
+    """
+    if not refresh_venue_directory():
+        raise click.ClickException('Refreshing the venue directory failed; see the log.')
+    page_cache.invalidate('venues')
+    click.echo('Refreshed the venue directory.')
+
+
+@app.cli.command('geocode-venues')
+@click.option('--all', 'everything', is_flag=True, help='Also relocate venues that already have coordinates.')
+@click.option('--gazetteer', 'path', type=click.Path(exists=True, dir_okay=False),
+              help='Gazetteer file; GAZETTEER_PATH by default.')
+def geocode_venues_command(everything, path):
+    """Locate venues at their city's centroid from the offline gazetteer."""
+    gazetteer = Gazetteer.load(path or app.config['GAZETTEER_PATH'])
+    located, unknown = geocode_venues(gazetteer, everything)
+    click.echo('Located {} venues from {} places.'.format(located, len(gazetteer)))
+    for (city, state), count in unknown.most_common(20):
+        click.echo('Not in the gazetteer: {}, {} ({} venues)'.format(city, state, count), err=True)
+
+
+@app.cli.command('compile-templates')
+def compile_templates_command():
+    """Compile every template into the bytecode cache, e.g. on deploy."""
+    if app.jinja_env.bytecode_cache is None:
+        raise click.ClickException('TEMPLATE_BYTECODE_CACHE is disabled.')
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    click.echo('Compiled {} templates.'.format(len(names)))
+
+
+@app.cli.command('export-shows')
+@click.option('--format', 'format', type=click.Choice(['ndjson', 'csv']), default='ndjson', show_default=True)
+@click.option('--output', type=click.File('wb'), default='-', help='File to write to, stdout by default.')
+@click.option('--start', help='Only shows starting on or after this date.')
+@click.option('--end', help='Only shows starting before this date.')
+@click.option('--city')
+@click.option('--state')
+def export_shows_command(format, output, start, end, city, state):
+    """Stream every show, joined to its venue and artist, as NDJSON or CSV."""
+    rows = show_export_rows(
+        dateutil.parser.parse(start) if start else None,
+        dateutil.parser.parse(end) if end else None,
+        city, state
+    )
+    for line in export_lines(rows, format):
+        output.write(line)
+
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('source', type=click.File('rb'))
+@click.option('--format', 'format', type=click.Choice(['csv', 'ndjson']),
+              help='Input format; guessed from the file extension by default.')
+def import_command(kind, source, format):
+    """Bulk load venues, artists or shows from a CSV or NDJSON file."""
+    report = bulk_import(kind, read_rows(decode_lines(source), format or guess_format(source.name)))
+    for error in report['errors']:
+        click.echo('line {}: {}'.format(error['line'], error['errors']), err=True)
+    click.echo('{} inserted, {} updated, {} rejected.'.format(
+        report['inserted'], report['updated'], len(report['errors'])))
+
+
+def _canonical_queries():
+    # The read paths behind each listing, detail and search page.
+    venue_id = db.session.query(db.func.min(Venue.id)).scalar()
+    artist_id = db.session.query(db.func.min(Artist.id)).scalar()
+    return [
+        ('venues', venue_directory),
+        ('show_venue', lambda: venue_detail(venue_id)),
+        ('artists', artist_list_page),
+        ('show_artist', lambda: artist_detail(artist_id)),
+        ('shows', show_feed_page),
+        ('search_venues', lambda: search_results(Venue, 'music')),
+        ('search_artists', lambda: search_results(Artist, 'band')),
+    ]
+
+
+def _seq_scans(plan):
+    # Yields (relation, rows read) for every sequential scan in an EXPLAIN plan tree.
+    if plan['Node Type'] == 'Seq Scan':
+        loops = plan.get('Actual Loops', 1)
+        rows = (plan.get('Actual Rows', 0) + plan.get('Rows Removed by Filter', 0)) * loops
+        yield plan['Relation Name'], rows
+    for child in plan.get('Plans', []):
+        for scan in _seq_scans(child):
+            yield scan
+
+
+@app.cli.command('db-explain')
+@click.option('--min-rows', default=1000, show_default=True,
+              help='Only flag sequential scans reading at least this many rows.')
+@click.pass_context
+def db_explain_command(ctx, min_rows):
+    """Run the app's canonical queries under EXPLAIN ANALYZE.
+
+    Every statement issued by each read path is captured and re-run under
+    EXPLAIN (ANALYZE, FORMAT JSON); sequential scans over large relations
+    are flagged and make the command exit non-zero.
+    """
+    if not using_postgres():
+        click.echo('db-explain requires PostgreSQL.')
+        ctx.exit(1)
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    flagged = 0
+    for name, run in _canonical_queries():
+        del statements[:]
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            run()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+
+        connection = db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for statement, parameters in statements:
+                cursor.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + statement, parameters)
+                plan = cursor.fetchone()[0][0]
+                scans = [(relation, rows) for relation, rows in _seq_scans(plan['Plan']) if rows >= min_rows]
+                for relation, rows in scans:
+                    click.echo('{}: sequential scan on {} ({} rows)'.format(name, relation, int(rows)))
+                if not scans:
+                    click.echo('{}: ok ({:.2f} ms)'.format(name, plan['Execution Time']))
+                flagged += len(scans)
+            connection.rollback()
+        finally:
+            connection.close()
+
+    if flagged:
+        ctx.exit(1)
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
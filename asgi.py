@@ -0,0 +1,303 @@
+#----------------------------------------------------------------------------#
+# ASGI entry point.
+#
+# Serves the venues directory and the venue and artist detail pages from async
+# SQLAlchemy (asyncpg on Postgres, aiosqlite on SQLite), running the
+# independent queries behind a page concurrently, each on its own pooled
+# connection. Pages are rendered with the Flask app's own templates, page
+# cache and validators, so responses match what app.py serves. Reads follow
+# the same primary/replica policy as the WSGI app (replicas.py). Every other
+# route, and any request these handlers cannot answer alone (pending flash
+# messages, missing rows), is passed to the WSGI app on a worker thread.
+#
+#   pip install -r requirements.txt
+#   uvicorn asgi:application --workers 4
+#
+# Flask's context locals are not task local, so a request context is only
+# ever pushed between awaits, never across one.
+#----------------------------------------------------------------------------#
+
+import io
+import re
+import sys
+import time
+import asyncio
+from datetime import datetime
+from contextlib import contextmanager
+
+try:
+    from sqlalchemy.ext.asyncio import create_async_engine
+except ImportError:
+    create_async_engine = None
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+    WsgiToAsgi = None
+
+from flask import Response, render_template, request, session, g
+
+from app import app, db, replicas, Venue, Artist, Show, page_cache, cached_html, set_cached_page, venue_directory_query, \
+    directory_areas, genre_facet_query, facet_list, venue_page, venue_show_entries, artist_page, \
+    artist_show_entries, version_query, make_validators, _not_modified
+from dbpool import async_database_uri, async_engine_options, install_statement_timeout
+from metrics import RequestMetrics
+
+
+def _environ(scope):
+    # The WSGI environ for an ASGI http scope, without a body: only GET and
+    # HEAD requests are answered here.
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin1')
+        environ[name] = environ[name] + ',' + value if name in environ else value
+    return environ
+
+
+class PageRequest(object):
+    # One page being served: the request's WSGI environ, metrics, and the
+    # cached or rendered HTML with the tags it is cached under.
+
+    def __init__(self, scope):
+        self.environ = _environ(scope)
+        self.metrics = RequestMetrics()
+        self.key = None
+        self.entry = None
+        self.html = None
+        self.validators = None
+        self.tags = set()
+        self.replica = None
+        self.deferred = False
+        self.conditional = False
+
+    @contextmanager
+    def context(self):
+        with app.request_context(self.environ):
+            g.metrics = self.metrics
+            if self.replica is not None:
+                g.db_replica = replicas.engines[self.replica]
+            yield
+
+    def open(self):
+        # Called in the first context: picks the replica the page reads
+        # from, as replicas.route_request() does, and picks up the cached
+        # page, unless the page would carry flash messages. Which ETag it was
+        # rendered for is only known once the validators are fetched; see
+        # validate().
+        self.replica = replicas.pick()
+        self.deferred = '_flashes' in session
+        self.conditional = bool(request.if_none_match or request.if_modified_since)
+        self.key = 'page:' + request.full_path
+        if not self.deferred:
+            self.entry = page_cache.get(self.key)
+
+    def validate(self, model, version):
+        # Called once the row's version is fetched: the cached page counts
+        # only if it was rendered for the current ETag.
+        self.validators = make_validators(model, version)
+        self.html = cached_html(self.entry, self.validators[0])
+
+    @property
+    def needs_body(self):
+        # Whether the page's own queries should run alongside the validator
+        # lookup. Conditional requests look up the validators first, since
+        # they usually end in a 304.
+        return self.entry is None and not self.conditional
+
+    def respond(self, render):
+        # As conditional_page() and cached_page(): a 304 from the validators,
+        # else the cached or freshly rendered page.
+        etag, last_modified = self.validators
+        if _not_modified(etag, last_modified):
+            response = Response(status=304)
+        else:
+            if self.html is None:
+                self.html = render()
+                if self.tags and not replicas.may_be_stale(page_cache.last_invalidated):
+                    set_cached_page(self.key, etag, self.html, self.tags)
+            response = app.make_response(self.html)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.no_cache = True
+        return app.process_response(response)
+
+
+class AsyncPages(object):
+
+    def __init__(self, flask_app, engine, replica_engines=()):
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.engine = engine
+        # Indexed as replicas.engines.
+        self.replica_engines = list(replica_engines)
+        self.routes = [
+            (re.compile(r'^/venues$'), self.venues),
+            (re.compile(r'^/venues/(\d+)$'), self.show_venue),
+            (re.compile(r'^/artists/(\d+)$'), self.show_artist),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            for pattern, handler in self.routes:
+                match = pattern.match(scope['path'])
+                if match:
+                    response = await handler(PageRequest(scope), *match.groups())
+                    if response is not None:
+                        return await self.send(scope, send, response)
+                    break
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in [self.engine] + self.replica_engines:
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def send(self, scope, send, response):
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(name.lower().encode('latin1'), value.encode('latin1'))
+                        for name, value in response.headers.to_wsgi_list()],
+        })
+        body = b'' if scope['method'] == 'HEAD' else response.get_data()
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def fetch(self, page, *statements):
+        # Runs each statement on its own connection, all at once.
+        engine = self.engine if page.replica is None else self.replica_engines[page.replica]
+        return await asyncio.gather(*[self._all(engine, page.metrics, statement) for statement in statements])
+
+    async def _all(self, engine, metrics, statement):
+        async with engine.connect() as connection:
+            started = time.perf_counter()
+            rows = (await connection.execute(statement)).all()
+            metrics.record_statement(str(statement.compile(dialect=engine.dialect)),
+                                     time.perf_counter() - started)
+            return rows
+
+    #  Pages
+    #  ----------------------------------------------------------------
+
+    async def venues(self, page):
+        with page.context():
+            page.open()
+            # Genre filtered listings are not read from the directory view.
+            if page.deferred or 'genre' in request.args:
+                return None
+            version = version_query(Venue).statement
+            body = [venue_directory_query().statement, genre_facet_query(Venue).statement]
+
+        results = await self.fetch(page, version, *(body if page.needs_body else []))
+        if results[0][0][0] is None:
+            return None
+        page.validate(Venue, results[0][0])
+        if page.html is None and len(results) == 1:
+            results += await self.fetch(page, *body)
+
+        def render():
+            page.tags.add('venues')
+            return render_template('pages/venues.html', areas=directory_areas(results[1]),
+                                   facets=facet_list(results[2], ()))
+
+        with page.context():
+            return page.respond(render)
+
+    async def show_venue(self, page, venue_id):
+        venue_id = int(venue_id)
+        with page.context():
+            page.open()
+            if page.deferred:
+                return None
+            now = datetime.now()
+            venue = db.session.query(Venue).filter(Venue.id == venue_id).statement
+            entries = venue_show_entries(venue_id)
+            shows = [entries.filter(Show.start_time <= now).statement,
+                     entries.filter(Show.start_time > now).statement]
+
+        results = await self.fetch(page, venue, *(shows if page.needs_body else []))
+        if not results[0]:
+            return None
+        venue = results[0][0]
+        page.validate(Venue, (venue.updated_at, venue.id))
+        if page.html is None and len(results) == 1:
+            results += await self.fetch(page, *shows)
+
+        def render():
+            past_shows, upcoming_shows = [[dict(row._mapping) for row in rows] for rows in results[1:]]
+            page.tags.update(['venue:%d' % venue_id] + ['artist:%d' % show['artist_id']
+                                                        for show in past_shows + upcoming_shows])
+            return render_template('pages/show_venue.html', venue=venue_page(venue, past_shows, upcoming_shows))
+
+        with page.context():
+            return page.respond(render)
+
+    async def show_artist(self, page, artist_id):
+        artist_id = int(artist_id)
+        with page.context():
+            page.open()
+            if page.deferred:
+                return None
+            now = datetime.now()
+            artist = db.session.query(Artist).filter(Artist.id == artist_id).statement
+            entries = artist_show_entries(artist_id)
+            shows = [entries.filter(Show.start_time <= now).statement,
+                     entries.filter(Show.start_time > now).statement]
+
+        results = await self.fetch(page, artist, *(shows if page.needs_body else []))
+        if not results[0]:
+            return None
+        artist = results[0][0]
+        page.validate(Artist, (artist.updated_at, artist.id))
+        if page.html is None and len(results) == 1:
+            results += await self.fetch(page, *shows)
+
+        def render():
+            past_shows, upcoming_shows = [[dict(row._mapping) for row in rows] for rows in results[1:]]
+            page.tags.update(['artist:%d' % artist_id] + ['venue:%d' % show['venue_id']
+                                                          for show in past_shows + upcoming_shows])
+            return render_template('pages/show_artist.html', artist=artist_page(artist, past_shows, upcoming_shows))
+
+        with page.context():
+            return page.respond(render)
+
+
+def create_application(flask_app):
+    if create_async_engine is None or WsgiToAsgi is None:
+        raise RuntimeError('ASGI mode requires SQLAlchemy>=1.4 and asgiref, plus asyncpg for Postgres')
+    engines = []
+    for uri in [flask_app.config['SQLALCHEMY_DATABASE_URI']] + [uri for uri, _ in flask_app.config['SQLALCHEMY_REPLICAS']]:
+        config = dict(flask_app.config, SQLALCHEMY_DATABASE_URI=uri)
+        engine = create_async_engine(async_database_uri(uri), **async_engine_options(config))
+        install_statement_timeout(engine.sync_engine, config)
+        engines.append(engine)
+    return AsyncPages(flask_app, engines[0], engines[1:])
+
+
+application = create_application(app)
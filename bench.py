@@ -0,0 +1,215 @@
+#----------------------------------------------------------------------------#
+# Benchmark harness.
+#
+# Seeds the database at several scales and drives every read route through
+# the Flask test client, reporting p50/p95 latency, SQL statements per
+# request (from the Server-Timing header) and peak Python memory. Point
+# DATABASE_URL at a scratch database: it is emptied for every scale. SQLite
+# schemas are created from the models; Postgres must already be migrated.
+#
+#   DATABASE_URL=sqlite:////tmp/fyyur-bench.db python bench.py --output bench_results.json
+#   python bench.py --compare bench_baseline.json bench_results.json
+#
+# --throughput instead compares requests per second for the pages asgi.py
+# serves natively: the WSGI app driven from a pool of threads against the
+# ASGI app driven from as many concurrent tasks, both in this one process.
+#----------------------------------------------------------------------------#
+
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+# Measure the work behind each page, not the page cache.
+os.environ.setdefault('CACHE_BACKEND', 'null')
+
+ROUTES = [
+    ('home', 'GET', '/', None),
+    ('venues', 'GET', '/venues', None),
+    ('show_venue', 'GET', '/venues/{venue_id}', None),
+    ('search_venues', 'POST', '/venues/search', {'search_term': 'the'}),
+    ('artists', 'GET', '/artists', None),
+    ('show_artist', 'GET', '/artists/{artist_id}', None),
+    ('search_artists', 'POST', '/artists/search', {'search_term': 'the'}),
+    ('shows', 'GET', '/shows', None),
+    ('api_shows', 'GET', '/api/v1/shows', None),
+    ('export_shows', 'GET', '/shows/export?format=csv', None),
+]
+ASYNC_ROUTES = ('venues', 'show_venue', 'show_artist')
+STATEMENTS = re.compile(r'desc="(\d+) statements"')
+
+
+def _percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))]
+
+
+def measure(client, method, path, data, iterations):
+    latencies = []
+    statements = 0
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = client.open(path, method=method, data=data)
+        response.get_data()
+        latencies.append((time.perf_counter() - started) * 1000)
+        match = STATEMENTS.search(response.headers.get('Server-Timing', ''))
+        statements = int(match.group(1)) if match else statements
+
+    tracemalloc.start()
+    client.open(path, method=method, data=data).get_data()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'p50_ms': round(_percentile(latencies, 0.5), 3),
+        'p95_ms': round(_percentile(latencies, 0.95), 3),
+        'statements': statements,
+        'peak_kib': round(peak / 1024.0, 1),
+    }
+
+
+def run(scales, iterations):
+    from app import app, db, Venue, Artist
+    from seed import seed_database
+
+    results = {}
+    client = app.test_client()
+    for scale in scales:
+        with app.app_context():
+            seed_database(venues=scale, artists=scale, shows=scale * 10)
+            # The busiest venue and artist: the worst case for detail pages.
+            ids = {
+                'venue_id': db.session.query(Venue.id).order_by(Venue.past_shows_count.desc()).first()[0],
+                'artist_id': db.session.query(Artist.id).order_by(Artist.past_shows_count.desc()).first()[0],
+            }
+            db.session.remove()
+
+        results[str(scale)] = {}
+        for name, method, path, data in ROUTES:
+            results[str(scale)][name] = measure(client, method, path.format(**ids), data, iterations)
+            print('{:>8} {:<16} {}'.format(scale, name, results[str(scale)][name]))
+    return results
+
+
+def sync_throughput(app, path, concurrency, requests):
+    def worker(count):
+        client = app.test_client()
+        for _ in range(count):
+            client.get(path).get_data()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, [requests // concurrency] * concurrency))
+    return requests // concurrency * concurrency / (time.perf_counter() - started)
+
+
+async def async_throughput(application, path, concurrency, requests):
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'root_path': '',
+             'headers': [(b'host', b'localhost')], 'http_version': '1.1', 'scheme': 'http',
+             'server': ('localhost', 80)}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        pass
+
+    async def worker(count):
+        for _ in range(count):
+            await application(scope, receive, send)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker(requests // concurrency) for _ in range(concurrency)])
+    return requests // concurrency * concurrency / (time.perf_counter() - started)
+
+
+def run_throughput(scales, concurrency, requests):
+    from app import app, db, Venue, Artist
+    from asgi import application
+    from seed import seed_database
+
+    async def async_routes(paths):
+        try:
+            return [await async_throughput(application, path, concurrency, requests) for path in paths]
+        finally:
+            # Pooled connections belong to this event loop.
+            await application.engine.dispose()
+
+    results = {}
+    for scale in scales:
+        with app.app_context():
+            seed_database(venues=scale, artists=scale, shows=scale * 10)
+            ids = {
+                'venue_id': db.session.query(Venue.id).order_by(Venue.past_shows_count.desc()).first()[0],
+                'artist_id': db.session.query(Artist.id).order_by(Artist.past_shows_count.desc()).first()[0],
+            }
+            db.session.remove()
+
+        routes = [(name, path.format(**ids)) for name, method, path, data in ROUTES if name in ASYNC_ROUTES]
+        sync_rps = [sync_throughput(app, path, concurrency, requests) for name, path in routes]
+        async_rps = asyncio.run(async_routes([path for name, path in routes]))
+        results[str(scale)] = {}
+        for (name, path), sync, async_ in zip(routes, sync_rps, async_rps):
+            results[str(scale)][name] = {'sync_rps': round(sync, 1), 'async_rps': round(async_, 1)}
+            print('{:>8} {:<16} sync {:>9.1f} req/s  async {:>9.1f} req/s ({:>5.2f}x)'.format(
+                scale, name, sync, async_, async_ / sync))
+    return results
+
+
+def compare(baseline, current, tolerance):
+    # Prints every route and scale side by side; returns the regressions,
+    # i.e. p95 latency beyond `tolerance` times the baseline or more SQL
+    # statements per request.
+    regressions = []
+    for scale, routes in sorted(current.items(), key=lambda item: int(item[0])):
+        for name, result in routes.items():
+            before = baseline.get(scale, {}).get(name)
+            if before is None:
+                print('{:>8} {:<16} new'.format(scale, name))
+                continue
+            ratio = result['p95_ms'] / before['p95_ms'] if before['p95_ms'] else 1.0
+            regressed = ratio > tolerance or result['statements'] > before['statements']
+            print('{:>8} {:<16} p95 {:>9.2f} -> {:>9.2f} ms ({:>5.2f}x)  statements {:>3} -> {:>3}{}'.format(
+                scale, name, before['p95_ms'], result['p95_ms'], ratio,
+                before['statements'], result['statements'], '  REGRESSION' if regressed else ''))
+            if regressed:
+                regressions.append((scale, name))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark every route at several data scales.')
+    parser.add_argument('--scales', default='100,1000,10000',
+                        help='Comma separated venue/artist counts; shows are ten times as many.')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--output', help='Write results as JSON to this file.')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'RESULTS'),
+                        help='Compare two result files instead of running.')
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help='Allowed p95 slowdown factor when comparing.')
+    parser.add_argument('--throughput', action='store_true',
+                        help='Compare sync (WSGI) and async (ASGI) throughput instead of latency.')
+    parser.add_argument('--concurrency', type=int, default=10,
+                        help='Threads or tasks issuing requests at once in --throughput mode.')
+    parser.add_argument('--requests', type=int, default=500,
+                        help='Requests per route and mode in --throughput mode.')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as baseline, open(args.compare[1]) as current:
+            regressions = compare(json.load(baseline), json.load(current), args.tolerance)
+        sys.exit(1 if regressions else 0)
+
+    scales = [int(scale) for scale in args.scales.split(',')]
+    if args.throughput:
+        results = run_throughput(scales, args.concurrency, args.requests)
+    else:
+        results = run(scales, args.iterations)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
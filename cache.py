@@ -0,0 +1,183 @@
+import time
+import threading
+from collections import OrderedDict, defaultdict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+#----------------------------------------------------------------------------#
+# Tagged response cache.
+#
+# Entries are text (rendered pages or fragments) stored under a key along with
+# a set of tags naming the rows they were built from, e.g. 'venue:3'. Writes
+# invalidate by tag, so only the pages showing a changed row are dropped.
+# Each cache also records when it was last invalidated (see
+# ReplicaRouter.may_be_stale()).
+#----------------------------------------------------------------------------#
+
+
+class NullCache(object):
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, tags=(), ttl=None):
+        pass
+
+    def invalidate(self, *tags):
+        pass
+
+    def clear(self):
+        pass
+
+    def last_invalidated(self):
+        return 0.0
+
+
+class LRUCache(object):
+    # In-process, per-worker cache evicting least recently used entries once
+    # either max_entries or max_bytes (of stored text) is exceeded.
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()
+        self._tags = defaultdict(set)
+        self._lock = threading.Lock()
+        self.invalidated = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires, _, _ = entry
+            if expires < time.time():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags=(), ttl=None):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (value, expires, size, frozenset(tags))
+            self.size += size
+            for tag in tags:
+                self._tags[tag].add(key)
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self.invalidated = time.time()
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self.invalidated = time.time()
+            self._entries.clear()
+            self._tags.clear()
+            self.size = 0
+
+    def last_invalidated(self):
+        return self.invalidated
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry[2]
+        for tag in entry[3]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisCache(object):
+    # Shared cache for multi-worker deploys. Each tag is a Redis set of the
+    # keys carrying it, so any worker's write invalidates every worker's pages.
+
+    def __init__(self, url, ttl=300, prefix='fyyur:'):
+        if redis is None:
+            raise RuntimeError('CACHE_BACKEND=redis requires the redis package')
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else value.decode('utf-8')
+
+    def set(self, key, value, tags=(), ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, value.encode('utf-8'), ex=ttl)
+        for tag in tags:
+            pipe.sadd(self.prefix + 'tag:' + tag, self.prefix + key)
+            pipe.expire(self.prefix + 'tag:' + tag, ttl)
+        pipe.execute()
+
+    def invalidate(self, *tags):
+        self._mark_invalidated()
+        for tag in tags:
+            tag_key = self.prefix + 'tag:' + tag
+            keys = self.client.smembers(tag_key)
+            self.client.delete(tag_key, *keys)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+        self._mark_invalidated()
+
+    def last_invalidated(self):
+        # Shared by every worker, so it covers writes made anywhere.
+        value = self.client.get(self.prefix + 'invalidated')
+        return 0.0 if value is None else float(value)
+
+    def _mark_invalidated(self):
+        self.client.set(self.prefix + 'invalidated', repr(time.time()))
+
+
+def create_cache(config):
+    backend = config.get('CACHE_BACKEND', 'memory')
+    if backend == 'memory':
+        return LRUCache(
+            max_entries=config['CACHE_MAX_ENTRIES'],
+            max_bytes=config['CACHE_MAX_BYTES'],
+            ttl=config['CACHE_TTL']
+        )
+    if backend == 'redis':
+        return RedisCache(config['CACHE_REDIS_URL'], ttl=config['CACHE_TTL'])
+    if backend == 'null':
+        return NullCache()
+    raise ValueError('Unknown CACHE_BACKEND: {}'.format(backend))
+
+
+def create_fragment_cache(config):
+    # Rendered template fragments (see fragments.py). Their keys carry the
+    # versions of the rows they show and never need invalidating, so each
+    # worker keeps its own whatever the CACHE_BACKEND.
+    if not config['FRAGMENT_CACHE_MAX_ENTRIES']:
+        return NullCache()
+    return LRUCache(
+        max_entries=config['FRAGMENT_CACHE_MAX_ENTRIES'],
+        max_bytes=config['FRAGMENT_CACHE_MAX_BYTES'],
+        ttl=config['FRAGMENT_CACHE_TTL']
+    )
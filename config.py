@@ -1,5 +1,7 @@
 import os
-SECRET_KEY = os.urandom(32)
+# Signs the session cookie, so every worker must share it; the random
+# fallback only suits a single development process.
+SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -9,5 +11,99 @@ DEBUG = True
 # Connect to the database
 
 
-# TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgres://eugenelee@127.0.0.1:5432/fyyur'
+def _sqlalchemy_uri(uri):
+    # Heroku style URLs use the postgres:// scheme, which SQLAlchemy no longer accepts.
+    if uri.startswith('postgres://'):
+        return 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+SQLALCHEMY_DATABASE_URI = _sqlalchemy_uri(os.environ.get('DATABASE_URL', 'postgresql://eugenelee@127.0.0.1:5432/fyyur'))
+
+# Read replicas as comma separated URLs, each optionally followed by a space
+# and a relative weight: 'postgresql://replica1/fyyur 3, postgresql://replica2/fyyur'.
+# Only the READ_REPLICA_ENDPOINTS views read from them; a user's requests stay
+# on the primary for DB_REPLICA_STICKY_SECONDS after they submit a form.
+SQLALCHEMY_REPLICAS = [
+    (_sqlalchemy_uri(uri), int(weight or 1))
+    for uri, _, weight in (entry.strip().partition(' ')
+                           for entry in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if entry.strip())
+]
+DB_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 10))
+READ_REPLICA_ENDPOINTS = {
+    'venues', 'search_venues', 'show_venue',
+    'artists', 'search_artists', 'show_artist',
+    'shows', 'export_shows',
+    'api_venues', 'api_venue_areas', 'api_venue', 'api_search_venues', 'api_available_venues',
+    'api_venues_near', 'api_artists', 'api_artist', 'api_search_artists', 'api_shows', 'api_shows_near',
+}
+
+# Connection pool, per worker process. Size workers so that
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays under max_connections;
+# /debug/pool reports checkout waits and overflow events to size against.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+# 0 disables the timeout.
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+# Behind PgBouncer in transaction pooling mode: no client side pool.
+DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', 'false').lower() == 'true'
+
+# Listing pages are keyset paginated; ?limit= may request up to MAX_PAGE_SIZE rows.
+PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 50))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 500))
+
+# Search returns at most SEARCH_RESULT_LIMIT hits; totals are counted exactly
+# up to SEARCH_COUNT_LIMIT and reported as a lower bound beyond that.
+SEARCH_RESULT_LIMIT = int(os.environ.get('SEARCH_RESULT_LIMIT', 100))
+SEARCH_COUNT_LIMIT = int(os.environ.get('SEARCH_COUNT_LIMIT', 1000))
+
+# Rendered page cache: 'memory' (per worker LRU), 'redis' (shared) or 'null'.
+# Pages are cached under the versions of the rows they show, read from the
+# database, so writes by other workers or CLI commands are misses with either
+# backend; a per worker cache just holds the stale copies until they age out.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 300))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 64 * 1024 * 1024))
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+# Rows fetched per round trip when streaming the shows export.
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+# Rows written per executemany batch (and transaction) by bulk imports.
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+
+# Requests slower than this are logged with the SQL they issued.
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+
+# Home page highlights, rebuilt in the background this often and after writes.
+HIGHLIGHTS_REFRESH_SECONDS = int(os.environ.get('HIGHLIGHTS_REFRESH_SECONDS', 60))
+HIGHLIGHTS_LIMIT = int(os.environ.get('HIGHLIGHTS_LIMIT', 10))
+HIGHLIGHTS_WINDOW_DAYS = int(os.environ.get('HIGHLIGHTS_WINDOW_DAYS', 30))
+
+# Writes rebuild the venue directory in the background this many seconds
+# later, so a burst of them costs one refresh.
+VENUE_DIRECTORY_REFRESH_DELAY = float(os.environ.get('VENUE_DIRECTORY_REFRESH_DELAY', 1.0))
+
+# Formatted datetimes kept by the template `datetime` filter.
+DATETIME_CACHE_SIZE = int(os.environ.get('DATETIME_CACHE_SIZE', 4096))
+
+# Offline geocoding: city centroids from a CSV of city,state,latitude,longitude
+# rows or the US Census Bureau's national places gazetteer; see geo.py.
+GAZETTEER_PATH = os.environ.get('GAZETTEER_PATH', os.path.join(basedir, 'data', 'gazetteer.csv'))
+# Proximity searches cover NEAR_RADIUS_KM unless ?radius= asks for up to NEAR_MAX_RADIUS_KM.
+NEAR_RADIUS_KM = float(os.environ.get('NEAR_RADIUS_KM', 50))
+NEAR_MAX_RADIUS_KM = float(os.environ.get('NEAR_MAX_RADIUS_KM', 500))
+
+# Compiled templates are kept on disk so new workers load them instead of
+# compiling; in a per-user directory under the system temp dir by default.
+TEMPLATE_BYTECODE_CACHE = os.environ.get('TEMPLATE_BYTECODE_CACHE', 'true').lower() == 'true'
+TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get('TEMPLATE_BYTECODE_CACHE_DIR') or None
+
+# Rendered {% cache %} template fragments, per worker; 0 entries disables them.
+FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 20000))
+FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', 3600))
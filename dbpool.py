@@ -0,0 +1,144 @@
+import time
+import threading
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import NullPool, QueuePool
+
+#----------------------------------------------------------------------------#
+# Connection pool configuration and instrumentation.
+#----------------------------------------------------------------------------#
+
+
+class PoolStats(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def record_checkout(self, waited, overflowed):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            if overflowed:
+                self.overflow_events += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+
+def instrumented_pool(name):
+    # A QueuePool subclass recording how long each checkout waited and when
+    # it had to open an overflow connection. The stats live on the class so
+    # they survive the pool being recreated on engine.dispose().
+    class InstrumentedQueuePool(QueuePool):
+        stats = PoolStats(name)
+
+        def _do_get(self):
+            start = time.perf_counter()
+            overflow = self.overflow()
+            try:
+                connection = super(InstrumentedQueuePool, self)._do_get()
+            except exc.TimeoutError:
+                self.stats.record_timeout()
+                raise
+            self.stats.record_checkout(time.perf_counter() - start, self.overflow() > max(overflow, 0))
+            return connection
+
+    return InstrumentedQueuePool
+
+
+def engine_options(config, name='primary'):
+    # SQLAlchemy create_engine() options for a Postgres URI from the DB_*
+    # settings. In PgBouncer mode pooling is left to PgBouncer, and the
+    # statement timeout cannot be sent as a startup parameter, so it is set
+    # per transaction instead (see install_statement_timeout()).
+    if not config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+        return {}
+
+    if config['DB_PGBOUNCER']:
+        return {'poolclass': NullPool}
+
+    options = {
+        'poolclass': instrumented_pool(name),
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if config['DB_STATEMENT_TIMEOUT_MS']:
+        options['connect_args'] = {
+            'options': '-c statement_timeout={}'.format(config['DB_STATEMENT_TIMEOUT_MS'])
+        }
+    return options
+
+
+# Async drivers for the ASGI entry point (asgi.py), by database scheme.
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+
+def async_database_uri(uri):
+    scheme, rest = uri.split('://', 1)
+    return ASYNC_DRIVERS.get(scheme.split('+')[0], scheme) + '://' + rest
+
+
+def async_engine_options(config):
+    # create_async_engine() options mirroring engine_options(). asyncpg takes
+    # the statement timeout as a server setting, and must not cache prepared
+    # statements behind PgBouncer, which may hand each transaction a
+    # different server connection.
+    if not config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+        return {}
+
+    if config['DB_PGBOUNCER']:
+        return {'poolclass': NullPool, 'connect_args': {'statement_cache_size': 0}}
+
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if config['DB_STATEMENT_TIMEOUT_MS']:
+        options['connect_args'] = {
+            'server_settings': {'statement_timeout': str(config['DB_STATEMENT_TIMEOUT_MS'])}
+        }
+    return options
+
+
+def install_statement_timeout(engine, config):
+    if not (config['DB_PGBOUNCER'] and config['DB_STATEMENT_TIMEOUT_MS']):
+        return
+
+    @event.listens_for(engine, 'begin')
+    def set_statement_timeout(connection):
+        connection.execute('SET LOCAL statement_timeout = {:d}'.format(config['DB_STATEMENT_TIMEOUT_MS']))
+
+
+def pool_snapshot(pool):
+    snapshot = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        snapshot.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'overflow': max(pool.overflow(), 0),
+        })
+    stats = getattr(pool, 'stats', None)
+    if stats is not None:
+        snapshot.update({
+            'name': stats.name,
+            'checkouts': stats.checkouts,
+            'wait_seconds_total': round(stats.wait_seconds_total, 6),
+            'wait_seconds_max': round(stats.wait_seconds_max, 6),
+            'overflow_events': stats.overflow_events,
+            'timeouts': stats.timeouts,
+        })
+    return snapshot
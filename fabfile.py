@@ -7,7 +7,7 @@ from fabric.contrib.console import confirm
 def test():
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m unittest discover -p 'test_*.py' -v", capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
@@ -27,6 +27,27 @@ def prepare():
     commit()
     push()
 
+# benchmark
+
+
+def bench(scales='100,1000,10000'):
+    local("python bench.py --scales {} --output bench_results.json".format(scales))
+
+
+def bench_compare(baseline='bench_baseline.json', results='bench_results.json'):
+    with settings(warn_only=True):
+        result = local("python bench.py --compare {} {}".format(baseline, results))
+    if result.failed and not confirm("Benchmark regressed. Continue?"):
+        abort("Aborted at user request.")
+
+
+def bench_baseline():
+    local("cp bench_results.json bench_baseline.json")
+
+
+def bench_throughput(scales='1000', concurrency=10):
+    local("python bench.py --throughput --scales {} --concurrency {}".format(scales, concurrency))
+
 # deploy to heroku
 
 
@@ -40,7 +61,7 @@ def heroku():
 
 def heroku_test():
     local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
+        "heroku run python -m unittest discover -p 'test_*.py' -v"
     )
 
 
@@ -0,0 +1,44 @@
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+#----------------------------------------------------------------------------#
+# Template fragment cache.
+#
+#   {% cache 'show', show.id, show.version %} ... {% endcache %}
+#
+# Renders the block once per distinct key and reuses the output afterwards.
+# The key is the template name and line plus the given values, which should
+# include a version of every row the block shows, so a changed row simply
+# misses instead of needing invalidation. The cache is the environment's
+# `fragment_cache`, anything with get() and set() (see cache.py); when it is
+# None blocks render every time.
+#----------------------------------------------------------------------------#
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super(FragmentCacheExtension, self).__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [nodes.Const('{}:{}'.format(parser.name, lineno)), parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(parts)]), [], [], body) \
+            .set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        key = 'fragment:' + ':'.join(str(part) for part in parts)
+        html = cache.get(key)
+        if html is None:
+            html = caller()
+            cache.set(key, html)
+        return Markup(html)
@@ -0,0 +1,152 @@
+import csv
+import math
+
+from sqlalchemy import event
+
+#----------------------------------------------------------------------------#
+# Geocoding and proximity.
+#
+# Venues are located offline from a gazetteer of place centroids and indexed
+# by geohash: the base32 interleaving of latitude and longitude bits, so that
+# every point in a grid cell shares the cell's hash as a prefix. A radius
+# search reads the cell around the centre and its eight neighbours, at the
+# finest precision whose cells still span the radius, as B-tree ranges, then
+# checks exact great-circle distances on those candidates only.
+#
+# The gazetteer is a CSV of city, state, latitude, longitude rows, or the
+# US Census Bureau's national places gazetteer file as downloaded.
+#----------------------------------------------------------------------------#
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 12
+EARTH_RADIUS_KM = 6371.0088
+
+# Census place names carry their legal type, e.g. "Austin city".
+PLACE_TYPES = (' city and borough', ' unified government (balance)', ' metropolitan government (balance)',
+               ' consolidated government (balance)', ' city', ' town', ' village', ' borough', ' cdp',
+               ' municipality')
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    # (latitude, longitude) extent in degrees of a cell at `precision`.
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** (5 * precision - lat_bits)
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    if None in (lat1, lon1, lat2, lon2):
+        return None
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def covering_prefixes(latitude, longitude, radius_km):
+    # Geohash prefixes of cells that together contain every point within
+    # `radius_km`; [''] (everything) when no precision is coarse enough or
+    # the circle reaches a pole.
+    lat_span = math.degrees(radius_km / EARTH_RADIUS_KM)
+    if abs(latitude) + lat_span >= 90:
+        return ['']
+    ratio = math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(latitude))
+    lon_span = math.degrees(math.asin(min(1.0, ratio)))
+
+    for precision in range(PRECISION, 0, -1):
+        cell_lat, cell_lon = cell_size(precision)
+        if cell_lat >= lat_span and cell_lon >= lon_span:
+            break
+    else:
+        return ['']
+
+    prefixes = set()
+    for lat_step in (-1, 0, 1):
+        lat = latitude + lat_step * cell_lat
+        if not -90 <= lat <= 90:
+            continue
+        for lon_step in (-1, 0, 1):
+            lon = (longitude + lon_step * cell_lon + 180) % 360 - 180
+            prefixes.add(encode(lat, lon, precision))
+    return sorted(prefixes)
+
+
+def prefix_range(prefix):
+    # The first and last full length geohash starting with `prefix`.
+    padding = PRECISION - len(prefix)
+    return prefix + BASE32[0] * padding, prefix + BASE32[-1] * padding
+
+
+def install_sqlite_functions(engine):
+    # The distance function the migrations create on Postgres.
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def create_functions(dbapi_connection, connection_record):
+        dbapi_connection.create_function('fyyur_distance_km', 4, distance_km, deterministic=True)
+
+
+def _place_key(city, state):
+    return ' '.join(city.lower().split()), state.strip().upper()
+
+
+def _census_place_name(name):
+    lowered = name.lower()
+    for place_type in PLACE_TYPES:
+        if lowered.endswith(place_type):
+            return name[:-len(place_type)]
+    return name
+
+
+class Gazetteer(object):
+
+    def __init__(self, places=None):
+        self.places = places or {}
+
+    def __len__(self):
+        return len(self.places)
+
+    @classmethod
+    def load(cls, path):
+        places = {}
+        with open(path, newline='', encoding='utf-8') as source:
+            census = 'INTPTLAT' in source.readline()
+            source.seek(0)
+            if census:
+                rows = csv.DictReader(source, delimiter='\t')
+                columns = ('NAME', 'USPS', 'INTPTLAT', 'INTPTLONG')
+            else:
+                rows = csv.DictReader(source)
+                columns = ('city', 'state', 'latitude', 'longitude')
+            for row in rows:
+                row = {name.strip(): value for name, value in row.items() if name}
+                city, state, latitude, longitude = (row[column].strip() for column in columns)
+                if census:
+                    city = _census_place_name(city)
+                # Where a state has two places of one name, the first wins.
+                places.setdefault(_place_key(city, state), (float(latitude), float(longitude)))
+        return cls(places)
+
+    def locate(self, city, state):
+        if not city or not state:
+            return None
+        return self.places.get(_place_key(city, state))
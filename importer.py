@@ -0,0 +1,139 @@
+import csv
+import json
+
+from werkzeug.datastructures import MultiDict
+from wtforms.validators import DataRequired
+
+from forms import ArtistForm, ShowForm, VenueForm, DEFAULT_SHOW_MINUTES
+
+#----------------------------------------------------------------------------#
+# Bulk import parsing and validation.
+#
+# Rows come from CSV (with a header line) or NDJSON and are validated with
+# the same forms the create pages use; app.bulk_import() writes them.
+#----------------------------------------------------------------------------#
+
+IMPORT_FORMS = {
+    'venues': (VenueForm, ('name', 'city', 'state', 'address', 'phone', 'genres', 'image_link',
+                           'website', 'facebook_link', 'seeking_talent', 'seeking_description')),
+    'artists': (ArtistForm, ('name', 'city', 'state', 'phone', 'genres', 'image_link',
+                             'website', 'facebook_link', 'seeking_venue', 'seeking_description')),
+    'shows': (ShowForm, ('venue_id', 'artist_id', 'start_time', 'duration_minutes')),
+}
+
+# Values for fields a row leaves out. Other form defaults (e.g. a show's start
+# time) are meant for the create pages, so a row missing a required field is
+# rejected rather than filled in.
+IMPORT_DEFAULTS = {
+    'shows': {'duration_minutes': DEFAULT_SHOW_MINUTES},
+}
+
+INTEGER_FIELDS = ('venue_id', 'artist_id')
+TRUE_VALUES = ('1', 'true', 't', 'yes', 'y', 'on')
+
+
+def guess_format(filename):
+    return 'ndjson' if filename and filename.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+class RowError(ValueError):
+    # Stands in for a line that could not be parsed into a row, so it is
+    # reported by validate_row() like any other invalid row.
+    pass
+
+
+def decode_lines(stream, encoding='utf-8'):
+    # Text lines of a binary stream. Lines are split on b'\n' alone, as
+    # newline='' would, so quoted CSV fields keep their line breaks, and
+    # decoded one at a time, so bad text is found at its own line.
+    for line in stream:
+        yield line.decode(encoding)
+
+
+def read_rows(stream, format):
+    # Yields (line number, row dict) from text lines (see decode_lines()), or
+    # a RowError for a line that is not a JSON object. A line that does not
+    # decode ends the file with a RowError, as the lines after it are not read.
+    line_number = 0
+    try:
+        if format == 'ndjson':
+            for line_number, line in enumerate(stream, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as error:
+                    row = RowError('Not valid JSON: {}'.format(error))
+                yield line_number, row
+        else:
+            reader = csv.DictReader(stream)
+            for row in reader:
+                line_number = reader.line_num
+                yield line_number, row
+    except UnicodeDecodeError as error:
+        yield line_number + 1, RowError('Not valid {} text ({}); the rest of the file was not read.'.format(
+            error.encoding.upper(), error.reason))
+
+
+def _formdata(row):
+    formdata = MultiDict()
+    for key, value in row.items():
+        # Values past the end of a CSV header come under the key None.
+        if key is None or value is None or value == '':
+            continue
+        if key == 'genres':
+            if isinstance(value, str):
+                value = [genre.strip() for genre in value.split(',') if genre.strip()]
+            formdata.setlist(key, value)
+        elif isinstance(value, bool):
+            if value:
+                formdata[key] = 'y'
+        elif key.startswith('seeking_') and key != 'seeking_description':
+            if str(value).strip().lower() in TRUE_VALUES:
+                formdata[key] = 'y'
+        else:
+            formdata[key] = str(value).strip()
+    return formdata
+
+
+def validate_row(kind, row):
+    # Returns (values, errors) for one row. Fields the row leaves empty are
+    # only checked when the form marks them DataRequired, so that e.g. the
+    # URL rules apply to links that are given rather than demanding them.
+    if isinstance(row, RowError):
+        return {}, {"row": [str(row)]}
+    if not isinstance(row, dict):
+        return {}, {"row": ['Not a JSON object.']}
+
+    form_class, fields = IMPORT_FORMS[kind]
+    defaults = IMPORT_DEFAULTS.get(kind, {})
+    formdata = _formdata(row)
+    form = form_class(formdata=formdata, meta={'csrf': False})
+
+    values = {}
+    errors = {}
+    for name in fields:
+        field = getattr(form, name)
+        required = any(isinstance(validator, DataRequired) for validator in field.validators)
+        if name not in formdata and name in defaults:
+            values[name] = defaults[name]
+            continue
+        if name not in formdata and required:
+            errors[name] = ['This field is required.']
+            continue
+        if name not in formdata and not isinstance(field.data, bool):
+            values[name] = None
+            continue
+        if not field.validate(form):
+            errors[name] = list(field.errors)
+            continue
+        values[name] = field.data
+
+    for name in INTEGER_FIELDS:
+        if name in values and name not in errors:
+            try:
+                values[name] = int(values[name])
+            except (TypeError, ValueError):
+                errors[name] = ['Not a valid integer.']
+
+    return values, errors
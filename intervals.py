@@ -0,0 +1,44 @@
+import bisect
+from collections import defaultdict
+
+#----------------------------------------------------------------------------#
+# In-memory interval index.
+#
+# Half-open [start, end) intervals grouped by key (e.g. a venue), each group
+# kept sorted by start. An overlap query bisects to the intervals starting
+# before `end` and walks back only as far as the group's longest interval
+# could reach, so with bounded show lengths a lookup costs O(log n + k).
+# Used to check a whole import batch of proposed shows against each other
+# and against the shows already booked around them.
+#----------------------------------------------------------------------------#
+
+
+class IntervalIndex(object):
+
+    def __init__(self):
+        self._starts = defaultdict(list)
+        self._intervals = defaultdict(list)
+        self._longest = {}
+
+    def add(self, key, start, end, label=None):
+        starts = self._starts[key]
+        position = bisect.bisect_right(starts, start)
+        starts.insert(position, start)
+        self._intervals[key].insert(position, (start, end, label))
+        length = end - start
+        if key not in self._longest or length > self._longest[key]:
+            self._longest[key] = length
+
+    def first_overlap(self, key, start, end):
+        # Returns the label of an interval under `key` overlapping
+        # [start, end), or None when there is none.
+        starts = self._starts.get(key)
+        if not starts:
+            return None
+        intervals = self._intervals[key]
+        lowest = bisect.bisect_right(starts, start - self._longest[key])
+        for position in range(lowest, bisect.bisect_left(starts, end)):
+            other_start, other_end, label = intervals[position]
+            if other_end > start:
+                return label
+        return None
@@ -0,0 +1,167 @@
+import time
+import threading
+from collections import defaultdict
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+
+#----------------------------------------------------------------------------#
+# Per-request instrumentation.
+#
+# SQLAlchemy cursor events and Flask template signals accumulate statement
+# count, database time and template render time on flask.g; after_request
+# turns that into a Server-Timing header, per-endpoint Prometheus series and,
+# past SLOW_REQUEST_MS, a warning that carries the statements issued.
+#----------------------------------------------------------------------------#
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_LOGGED_STATEMENTS = 50
+
+
+class RequestMetrics(object):
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.log = []
+
+    def record_statement(self, statement, seconds):
+        self.statements += 1
+        self.db_seconds += seconds
+        if len(self.log) < MAX_LOGGED_STATEMENTS:
+            self.log.append((seconds, statement))
+
+
+class EndpointStats(object):
+
+    def __init__(self):
+        self.requests = 0
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.duration_seconds = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+
+class MetricsRegistry(object):
+
+    def __init__(self):
+        self.endpoints = defaultdict(EndpointStats)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, metrics, duration):
+        with self._lock:
+            stats = self.endpoints[endpoint]
+            stats.requests += 1
+            stats.statements += metrics.statements
+            stats.db_seconds += metrics.db_seconds
+            stats.template_seconds += metrics.template_seconds
+            stats.duration_seconds += duration
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    stats.buckets[index] += 1
+
+    def render(self, gauges=()):
+        # Prometheus text exposition format. `gauges` are extra
+        # (name, help, value) triples, e.g. connection pool state.
+        lines = []
+
+        def family(name, kind, help):
+            lines.append('# HELP {} {}'.format(name, help))
+            lines.append('# TYPE {} {}'.format(name, kind))
+
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            family('fyyur_requests_total', 'counter', 'Requests handled, per endpoint.')
+            for endpoint, stats in endpoints:
+                lines.append('fyyur_requests_total{{endpoint="{}"}} {}'.format(endpoint, stats.requests))
+            family('fyyur_db_statements_total', 'counter', 'SQL statements executed, per endpoint.')
+            for endpoint, stats in endpoints:
+                lines.append('fyyur_db_statements_total{{endpoint="{}"}} {}'.format(endpoint, stats.statements))
+            family('fyyur_db_seconds_total', 'counter', 'Time spent executing SQL, per endpoint.')
+            for endpoint, stats in endpoints:
+                lines.append('fyyur_db_seconds_total{{endpoint="{}"}} {:.6f}'.format(endpoint, stats.db_seconds))
+            family('fyyur_template_seconds_total', 'counter', 'Time spent rendering templates, per endpoint.')
+            for endpoint, stats in endpoints:
+                lines.append('fyyur_template_seconds_total{{endpoint="{}"}} {:.6f}'.format(
+                    endpoint, stats.template_seconds))
+            family('fyyur_request_duration_seconds', 'histogram', 'Wall time per request, per endpoint.')
+            for endpoint, stats in endpoints:
+                for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+                    lines.append('fyyur_request_duration_seconds_bucket{{endpoint="{}",le="{}"}} {}'.format(
+                        endpoint, bound, count))
+                lines.append('fyyur_request_duration_seconds_bucket{{endpoint="{}",le="+Inf"}} {}'.format(
+                    endpoint, stats.requests))
+                lines.append('fyyur_request_duration_seconds_sum{{endpoint="{}"}} {:.6f}'.format(
+                    endpoint, stats.duration_seconds))
+                lines.append('fyyur_request_duration_seconds_count{{endpoint="{}"}} {}'.format(
+                    endpoint, stats.requests))
+
+        for name, help, value in gauges:
+            family(name, 'gauge', help)
+            lines.append('{} {}'.format(name, value))
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def _current():
+    return g.get('metrics') if has_request_context() else None
+
+
+def instrument_engine(engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        metrics = _current()
+        if metrics is not None:
+            metrics.record_statement(statement, elapsed)
+
+
+def instrument_app(app):
+    @app.before_request
+    def start_request_metrics():
+        g.metrics = RequestMetrics()
+
+    def template_started(sender, template, context, **extra):
+        metrics = _current()
+        if metrics is not None:
+            g.template_started = time.perf_counter()
+
+    def template_finished(sender, template, context, **extra):
+        metrics = _current()
+        started = g.pop('template_started', None)
+        if metrics is not None and started is not None:
+            metrics.template_seconds += time.perf_counter() - started
+
+    before_render_template.connect(template_started, app, weak=False)
+    template_rendered.connect(template_finished, app, weak=False)
+
+    @app.after_request
+    def finish_request_metrics(response):
+        metrics = g.get('metrics')
+        if metrics is None:
+            return response
+        duration = time.perf_counter() - metrics.started
+        endpoint = request.endpoint or 'unmatched'
+        registry.record(endpoint, metrics, duration)
+
+        response.headers['Server-Timing'] = 'db;dur={:.1f};desc="{} statements", tpl;dur={:.1f}, total;dur={:.1f}'.format(
+            metrics.db_seconds * 1000, metrics.statements, metrics.template_seconds * 1000, duration * 1000)
+
+        if duration * 1000 >= app.config['SLOW_REQUEST_MS']:
+            app.logger.warning(
+                'Slow request %s %s: %.1f ms total, %d statements in %.1f ms, templates %.1f ms\n%s',
+                request.method, request.full_path, duration * 1000, metrics.statements,
+                metrics.db_seconds * 1000, metrics.template_seconds * 1000,
+                '\n'.join('  [{:.1f} ms] {}'.format(seconds * 1000, statement)
+                          for seconds, statement in metrics.log)
+            )
+        return response
@@ -0,0 +1,40 @@
+"""venue coordinates and geohash
+
+Revision ID: 23c5eb96a526
+Revises: 6830fd090a15
+Create Date: 2026-10-18 14:16:32.840517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '23c5eb96a526'
+down_revision = '6830fd090a15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venues', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('venues', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('venues', sa.Column('geohash', sa.String(length=12), nullable=True))
+    op.create_index('ix_venues_geohash', 'venues', ['geohash'], unique=False)
+    # Great-circle distance in km; geo.distance_km() is the same on SQLite.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION fyyur_distance_km(float8, float8, float8, float8) RETURNS float8
+        LANGUAGE sql IMMUTABLE AS $$
+            SELECT 2 * 6371.0088 * asin(least(1, sqrt(
+                sin(radians($3 - $1) / 2) ^ 2 +
+                cos(radians($1)) * cos(radians($3)) * sin(radians($4 - $2) / 2) ^ 2)))
+        $$
+    """)
+
+
+def downgrade():
+    op.execute('DROP FUNCTION IF EXISTS fyyur_distance_km(float8, float8, float8, float8)')
+    op.drop_index('ix_venues_geohash', table_name='venues')
+    op.drop_column('venues', 'geohash')
+    op.drop_column('venues', 'longitude')
+    op.drop_column('venues', 'latitude')
@@ -0,0 +1,53 @@
+"""show durations and booking exclusion constraints
+
+Revision ID: 25fa23e53b02
+Revises: 6d987d9918bd
+Create Date: 2026-10-18 12:41:09.517730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '25fa23e53b02'
+down_revision = '6d987d9918bd'
+branch_labels = None
+depends_on = None
+
+# start_time is a timestamp without time zone, so bookings are tsranges;
+# timestamp + interval is IMMUTABLE, as an index expression must be.
+BOOKING = "tsrange(start_time, start_time + duration_minutes * interval '1 minute')"
+
+
+def upgrade():
+    op.add_column('shows', sa.Column('duration_minutes', sa.Integer(), server_default='120', nullable=False))
+    op.create_check_constraint('ck_shows_duration_minutes', 'shows',
+                               'duration_minutes > 0 AND duration_minutes <= 1440')
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+
+    # Existing double-bookings would make the constraints fail to build;
+    # name them so they can be fixed by hand.
+    clashes = op.get_bind().execute(sa.text("""
+        SELECT a.id, b.id FROM shows a JOIN shows b
+          ON a.id < b.id
+         AND (a.venue_id = b.venue_id OR a.artist_id = b.artist_id)
+         AND b.start_time < a.start_time + a.duration_minutes * interval '1 minute'
+         AND a.start_time < b.start_time + b.duration_minutes * interval '1 minute'
+        ORDER BY a.id, b.id LIMIT 50
+    """)).fetchall()
+    if clashes:
+        raise RuntimeError('Overlapping shows must be rescheduled or shortened first: ' +
+                           ', '.join('{} and {}'.format(a, b) for a, b in clashes))
+
+    op.execute('ALTER TABLE shows ADD CONSTRAINT ex_shows_venue_booking '
+               'EXCLUDE USING gist (venue_id WITH =, {} WITH &&)'.format(BOOKING))
+    op.execute('ALTER TABLE shows ADD CONSTRAINT ex_shows_artist_booking '
+               'EXCLUDE USING gist (artist_id WITH =, {} WITH &&)'.format(BOOKING))
+
+
+def downgrade():
+    op.execute('ALTER TABLE shows DROP CONSTRAINT ex_shows_artist_booking')
+    op.execute('ALTER TABLE shows DROP CONSTRAINT ex_shows_venue_booking')
+    op.drop_constraint('ck_shows_duration_minutes', 'shows', type_='check')
+    op.drop_column('shows', 'duration_minutes')
@@ -0,0 +1,38 @@
+"""add denormalized show counters to venues and artists
+
+Revision ID: 2e9b12d5f758
+Revises: ec94f9574d88
+Create Date: 2026-10-18 10:02:17.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2e9b12d5f758'
+down_revision = 'ec94f9574d88'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill; `flask rebuild-show-counters` performs the same recomputation.
+    for table, column in (('venues', 'venue_id'), ('artists', 'artist_id')):
+        op.execute("""
+            UPDATE {table} SET
+                upcoming_shows_count = (SELECT count(*) FROM shows
+                                        WHERE shows.{column} = {table}.id AND shows.start_time > now()),
+                past_shows_count = (SELECT count(*) FROM shows
+                                    WHERE shows.{column} = {table}.id AND shows.start_time <= now())
+        """.format(table=table, column=column))
+
+
+def downgrade():
+    for table in ('artists', 'venues'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
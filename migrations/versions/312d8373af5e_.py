@@ -0,0 +1,26 @@
+"""add updated_at to venues and artists
+
+Revision ID: 312d8373af5e
+Revises: b79b77cb650a
+Create Date: 2026-10-18 11:31:52.906617
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '312d8373af5e'
+down_revision = 'b79b77cb650a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venues', sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+    op.add_column('artists', sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+
+
+def downgrade():
+    op.drop_column('artists', 'updated_at')
+    op.drop_column('venues', 'updated_at')
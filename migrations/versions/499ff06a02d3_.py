@@ -0,0 +1,24 @@
+"""index venues by area
+
+Revision ID: 499ff06a02d3
+Revises: 25fa23e53b02
+Create Date: 2026-10-18 13:02:55.264081
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '499ff06a02d3'
+down_revision = '25fa23e53b02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_venues_state_city', 'venues', ['state', 'city'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_venues_state_city', table_name='venues')
@@ -0,0 +1,57 @@
+"""artists.genres as an array, GIN indexed genres
+
+Revision ID: 6830fd090a15
+Revises: 499ff06a02d3
+Create Date: 2026-10-18 13:41:07.519324
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6830fd090a15'
+down_revision = '499ff06a02d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The trigram index is built on the old text column; it is rebuilt on
+    # the array below, matching the venues one.
+    op.execute('DROP INDEX IF EXISTS ix_artists_search_trgm')
+
+    # artists.genres was created as a String(120) while the app has always
+    # written lists to it, so rows hold array literals ('{Jazz,"Hip-Hop"}');
+    # anything else is taken as a comma separated list.
+    op.execute("""
+        CREATE FUNCTION fyyur_parse_genres(text) RETURNS varchar[]
+        LANGUAGE sql IMMUTABLE AS $$
+            SELECT CASE
+                WHEN $1 IS NULL OR btrim($1) = '' THEN NULL
+                WHEN btrim($1) LIKE '{%}' THEN btrim($1)::varchar[]
+                ELSE ARRAY(SELECT btrim(value) FROM unnest(string_to_array($1, ',')) AS value
+                           WHERE btrim(value) <> '')::varchar[]
+            END
+        $$
+    """)
+    op.execute('ALTER TABLE artists ALTER COLUMN genres TYPE varchar[] USING fyyur_parse_genres(genres)')
+    op.execute('DROP FUNCTION fyyur_parse_genres(text)')
+
+    op.execute("""
+        CREATE INDEX ix_artists_search_trgm ON artists
+        USING gin (fyyur_search_text(name, city, state, fyyur_genres_text(genres)) gin_trgm_ops)
+    """)
+    op.create_index('ix_venues_genres', 'venues', ['genres'], unique=False, postgresql_using='gin')
+    op.create_index('ix_artists_genres', 'artists', ['genres'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_artists_genres', table_name='artists')
+    op.drop_index('ix_venues_genres', table_name='venues')
+    op.execute('DROP INDEX IF EXISTS ix_artists_search_trgm')
+    op.execute('ALTER TABLE artists ALTER COLUMN genres TYPE varchar(120) USING CAST(genres AS TEXT)')
+    op.execute("""
+        CREATE INDEX ix_artists_search_trgm ON artists
+        USING gin (fyyur_search_text(name, city, state, CAST(genres AS TEXT)) gin_trgm_ops)
+    """)
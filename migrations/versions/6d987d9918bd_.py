@@ -0,0 +1,34 @@
+"""venue_directory materialized view
+
+Revision ID: 6d987d9918bd
+Revises: 312d8373af5e
+Create Date: 2026-10-18 12:07:41.382154
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d987d9918bd'
+down_revision = '312d8373af5e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # One row per area with its venues pre-aggregated, in directory order.
+    # The unique index is what REFRESH ... CONCURRENTLY requires.
+    op.execute("""
+        CREATE MATERIALIZED VIEW venue_directory AS
+        SELECT state, city,
+               json_agg(json_build_object('id', id, 'name', name, 'num_upcoming_shows', upcoming_shows_count)
+                        ORDER BY name, id) AS venues
+        FROM venues
+        GROUP BY state, city
+    """)
+    op.execute('CREATE UNIQUE INDEX ix_venue_directory_state_city ON venue_directory (state, city)')
+
+
+def downgrade():
+    op.execute('DROP MATERIALIZED VIEW venue_directory')
@@ -0,0 +1,30 @@
+"""per-table versions for listing validators
+
+Revision ID: 8f3c2d1a9b47
+Revises: 23c5eb96a526
+Create Date: 2026-10-19 09:12:41.503218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3c2d1a9b47'
+down_revision = '23c5eb96a526'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_versions = op.create_table('table_versions',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(table_versions, [{'name': name} for name in ('venues', 'artists', 'shows')])
+
+
+def downgrade():
+    op.drop_table('table_versions')
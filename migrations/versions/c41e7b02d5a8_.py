@@ -0,0 +1,26 @@
+"""version the venue directory
+
+Revision ID: c41e7b02d5a8
+Revises: 8f3c2d1a9b47
+Create Date: 2026-10-19 10:04:17.226940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e7b02d5a8'
+down_revision = '8f3c2d1a9b47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bumped by each refresh of the venue_directory view; the venues
+    # listing is validated from it along with the venues row.
+    op.execute("INSERT INTO table_versions (name) VALUES ('venue_directory')")
+
+
+def downgrade():
+    op.execute("DELETE FROM table_versions WHERE name = 'venue_directory'")
@@ -0,0 +1,46 @@
+"""add trigram search indexes on venues and artists
+
+Revision ID: ec94f9574d88
+Revises: 92c7b96723f4
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ec94f9574d88'
+down_revision = '92c7b96723f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # array_to_string() is only STABLE, so index expressions go through these
+    # IMMUTABLE wrappers. app.search_document() builds the same expressions.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION fyyur_genres_text(text[]) RETURNS text
+        LANGUAGE sql IMMUTABLE AS $$ SELECT array_to_string($1, ' ') $$
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION fyyur_search_text(VARIADIC text[]) RETURNS text
+        LANGUAGE sql IMMUTABLE AS $$ SELECT lower(array_to_string($1, ' ')) $$
+    """)
+    op.execute("""
+        CREATE INDEX ix_venues_search_trgm ON venues
+        USING gin (fyyur_search_text(name, city, state, fyyur_genres_text(genres)) gin_trgm_ops)
+    """)
+    # artists.genres is still a plain string column here.
+    op.execute("""
+        CREATE INDEX ix_artists_search_trgm ON artists
+        USING gin (fyyur_search_text(name, city, state, CAST(genres AS TEXT)) gin_trgm_ops)
+    """)
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS ix_artists_search_trgm')
+    op.execute('DROP INDEX IF EXISTS ix_venues_search_trgm')
+    op.execute('DROP FUNCTION IF EXISTS fyyur_search_text(VARIADIC text[])')
+    op.execute('DROP FUNCTION IF EXISTS fyyur_genres_text(text[])')
@@ -0,0 +1,84 @@
+import time
+import random
+
+from flask import g, request, session, has_app_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, orm
+
+from dbpool import engine_options
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#
+# Requests to the READ_REPLICA_ENDPOINTS views read from one of
+# SQLALCHEMY_REPLICAS, picked by weight once per request so a page is built
+# from a single replica. Everything else goes to the primary: other views,
+# any flush, and all of a user's requests for DB_REPLICA_STICKY_SECONDS after
+# they submit a form, so they see their own writes.
+#----------------------------------------------------------------------------#
+
+STICKY_KEY = '_db_primary_until'
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = g.get('db_replica') if has_app_context() else None
+        if replica is not None and not self._flushing:
+            return replica
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+class ReplicaRouter(object):
+
+    def __init__(self, app):
+        self.sticky_seconds = app.config['DB_REPLICA_STICKY_SECONDS']
+        self.endpoints = app.config['READ_REPLICA_ENDPOINTS']
+        self.engines = []
+        self.weights = []
+        for index, (uri, weight) in enumerate(app.config['SQLALCHEMY_REPLICAS']):
+            options = engine_options(dict(app.config, SQLALCHEMY_DATABASE_URI=uri), name='replica%d' % index)
+            self.engines.append(create_engine(uri, **options))
+            self.weights.append(weight)
+        # When this worker last handled a write; see may_be_stale().
+        self.last_write = 0.0
+
+        if self.engines:
+            app.before_request(self.route_request)
+            app.after_request(self.record_write)
+
+    def route_request(self):
+        index = self.pick()
+        if index is not None:
+            g.db_replica = self.engines[index]
+
+    def pick(self):
+        # The index of the replica the current request reads from, or None
+        # for the primary. asgi.py routes its async engines by the same index.
+        if self.engines and request.endpoint in self.endpoints and session.get(STICKY_KEY, 0) < time.time():
+            return random.choices(range(len(self.engines)), self.weights)[0]
+        return None
+
+    def record_write(self, response):
+        if request.method not in ('GET', 'HEAD') and request.endpoint not in self.endpoints:
+            self.last_write = time.time()
+            session[STICKY_KEY] = self.last_write + self.sticky_seconds
+        return response
+
+    def may_be_stale(self, last_invalidated=None):
+        # Whether this request reads from a replica that may not have caught
+        # up with a recent write, so its page should not be cached. This
+        # worker knows its own writes; `last_invalidated`, the page cache's
+        # method of that name, tells of writes anywhere when it is shared.
+        if g.get('db_replica') is None:
+            return False
+        last_write = self.last_write
+        if last_invalidated is not None:
+            last_write = max(last_write, last_invalidated())
+        return time.time() - last_write < self.sticky_seconds
@@ -0,0 +1,68 @@
+import re
+from collections import defaultdict
+
+#----------------------------------------------------------------------------#
+# In-process trigram index.
+#
+# Mirrors what the pg_trgm GIN indexes do on Postgres so search behaves the
+# same against SQLite: documents are posted under every trigram they contain,
+# a substring query intersects the posting lists of its own trigrams, and
+# matches are ranked by pg_trgm style trigram similarity.
+#----------------------------------------------------------------------------#
+
+_WORD = re.compile(r'\w+')
+
+
+def trigrams(text):
+    # Trigrams of the raw lower-cased text, used for substring matching.
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def word_trigrams(text):
+    # pg_trgm style trigrams: every word is padded with two leading and one
+    # trailing space before being split up, used for ranking.
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        grams |= trigrams('  ' + word + ' ')
+    return grams
+
+
+def similarity(a, b):
+    a, b = word_trigrams(a), word_trigrams(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / float(len(a | b))
+
+
+class TrigramIndex(object):
+
+    def __init__(self):
+        self._postings = defaultdict(set)
+        self._documents = {}
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, key, name, *fields):
+        document = ' '.join(field for field in (name,) + fields if field).lower()
+        self._documents[key] = (name or '', document)
+        for gram in trigrams(document):
+            self._postings[gram].add(key)
+
+    def search(self, term):
+        # Returns the keys of every document containing `term`, best first.
+        term = term.lower()
+        grams = trigrams(term)
+        if grams:
+            postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+            candidates = set.intersection(*postings)
+        else:
+            candidates = self._documents.keys()
+
+        matches = [key for key in candidates if term in self._documents[key][1]]
+        return sorted(matches, key=lambda key: (
+            -similarity(self._documents[key][0], term),
+            self._documents[key][0],
+            key
+        ))
@@ -0,0 +1,163 @@
+#----------------------------------------------------------------------------#
+# Synthetic data generator.
+#
+# Creates venues, artists and shows with skewed, roughly realistic
+# distributions: a few big cities hold most venues, a few busy venues and
+# touring artists hold most shows, and shows cluster in the evenings over a
+# window running from two years ago to one year ahead.
+#
+#   python seed.py --venues 1000 --artists 2000 --shows 20000
+#----------------------------------------------------------------------------#
+
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from forms import VenueForm
+from geo import encode
+
+CITIES = [
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'), ('Houston', 'TX'),
+    ('San Francisco', 'CA'), ('Austin', 'TX'), ('Seattle', 'WA'), ('Nashville', 'TN'),
+    ('New Orleans', 'LA'), ('Atlanta', 'GA'), ('Denver', 'CO'), ('Portland', 'OR'),
+    ('Philadelphia', 'PA'), ('Boston', 'MA'), ('Miami', 'FL'), ('Detroit', 'MI'),
+    ('Minneapolis', 'MN'), ('Memphis', 'TN'), ('Kansas City', 'MO'), ('Las Vegas', 'NV'),
+]
+GENRES = [value for value, _ in VenueForm.genres.kwargs['choices']]
+VENUE_WORDS = ['Hall', 'Lounge', 'Club', 'Room', 'Theater', 'Tavern', 'Stage', 'Cellar', 'Garden', 'Warehouse']
+ARTIST_WORDS = ['Wild', 'Velvet', 'Electric', 'Midnight', 'Golden', 'Broken', 'Silver', 'Neon', 'Lonely', 'Crimson']
+ARTIST_NOUNS = ['Sax', 'Petals', 'Wolves', 'Echoes', 'Rivers', 'Machines', 'Hearts', 'Kings', 'Shadows', 'Sparrows']
+SLOT_ATTEMPTS = 20
+# Standard deviation, in degrees, of venue positions around their city's centroid.
+VENUE_SPREAD_DEGREES = 0.08
+
+
+def _zipf_weights(count, exponent=1.1):
+    return [1.0 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def generate(venues, artists, shows, seed=0, now=None, gazetteer=None):
+    # Returns (venues, artists, shows) as lists of column dicts. Shows refer
+    # to venues and artists by 1-based position, i.e. their ids when loaded
+    # into empty tables. Given a gazetteer, venues are scattered around their
+    # city's centroid, drawn from a separate generator so the rest of the
+    # data stays the same.
+    rng = random.Random(seed)
+    spread = random.Random(seed + 1)
+    now = now or datetime.now()
+    city_weights = _zipf_weights(len(CITIES))
+
+    venue_rows = []
+    for index in range(venues):
+        city, state = rng.choices(CITIES, city_weights)[0]
+        venue_rows.append({
+            'name': 'The {} {} {}'.format(rng.choice(ARTIST_WORDS), rng.choice(VENUE_WORDS), index + 1),
+            'city': city,
+            'state': state,
+            'address': '{} Main St'.format(rng.randint(1, 9999)),
+            'phone': '{:03d}-{:03d}-{:04d}'.format(rng.randint(200, 999), rng.randint(0, 999), rng.randint(0, 9999)),
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'website': 'https://venue{}.example.com'.format(index + 1),
+            'image_link': 'https://images.example.com/venues/{}.jpg'.format(index + 1),
+            'facebook_link': 'https://www.facebook.com/venue{}'.format(index + 1),
+            'seeking_talent': rng.random() < 0.3,
+            'seeking_description': None,
+        })
+        if gazetteer is not None:
+            location = {'latitude': None, 'longitude': None, 'geohash': None}
+            point = gazetteer.locate(city, state)
+            if point is not None:
+                latitude = point[0] + spread.gauss(0, VENUE_SPREAD_DEGREES)
+                longitude = point[1] + spread.gauss(0, VENUE_SPREAD_DEGREES)
+                location = {'latitude': latitude, 'longitude': longitude, 'geohash': encode(latitude, longitude)}
+            venue_rows[-1].update(location)
+
+    artist_rows = []
+    for index in range(artists):
+        city, state = rng.choices(CITIES, city_weights)[0]
+        artist_rows.append({
+            'name': 'The {} {} {}'.format(rng.choice(ARTIST_WORDS), rng.choice(ARTIST_NOUNS), index + 1),
+            'city': city,
+            'state': state,
+            'phone': '{:03d}-{:03d}-{:04d}'.format(rng.randint(200, 999), rng.randint(0, 999), rng.randint(0, 9999)),
+            'genres': rng.sample(GENRES, rng.randint(1, 2)),
+            'website': 'https://artist{}.example.com'.format(index + 1),
+            'image_link': 'https://images.example.com/artists/{}.jpg'.format(index + 1),
+            'facebook_link': 'https://www.facebook.com/artist{}'.format(index + 1),
+            'seeking_venue': rng.random() < 0.4,
+            'seeking_description': None,
+        })
+
+    show_rows = []
+    if venues and artists:
+        venue_weights = _zipf_weights(venues, 0.8)
+        artist_weights = _zipf_weights(artists, 0.8)
+        venue_ids = rng.choices(range(1, venues + 1), venue_weights, k=shows)
+        artist_ids = rng.choices(range(1, artists + 1), artist_weights, k=shows)
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        # Hour long shows in hourly evening slots; a pair whose venue or
+        # artist is already booked in the drawn slot redraws, and is dropped
+        # after a few tries, so no two shows overlap.
+        booked = set()
+        for venue_id, artist_id in zip(venue_ids, artist_ids):
+            for _ in range(SLOT_ATTEMPTS):
+                start_time = today + timedelta(days=rng.randint(-730, 365), hours=rng.choice([18, 19, 20, 21, 22]))
+                if ('venue', venue_id, start_time) not in booked and ('artist', artist_id, start_time) not in booked:
+                    break
+            else:
+                continue
+            booked.update((('venue', venue_id, start_time), ('artist', artist_id, start_time)))
+            show_rows.append({
+                'venue_id': venue_id,
+                'artist_id': artist_id,
+                'start_time': start_time,
+                'duration_minutes': 60,
+            })
+
+    return venue_rows, artist_rows, show_rows
+
+
+def reset_database():
+    from app import db, using_postgres
+
+    if using_postgres():
+        db.session.execute('TRUNCATE shows, venues, artists RESTART IDENTITY CASCADE')
+        db.session.commit()
+    else:
+        db.drop_all()
+        db.create_all()
+
+
+def seed_database(venues, artists, shows, seed=0, batch_size=5000):
+    # Empties the database and loads generated rows with executemany.
+    from app import app, Artist, Show, Venue, db, refresh_show_counters, refresh_venue_directory, page_cache, \
+        _search_fallback, bump_versions, VERSIONED_TABLES
+    from geo import Gazetteer
+
+    gazetteer = Gazetteer.load(app.config['GAZETTEER_PATH'])
+    venue_rows, artist_rows, show_rows = generate(venues, artists, shows, seed=seed, gazetteer=gazetteer)
+    reset_database()
+    for model, rows in ((Venue, venue_rows), (Artist, artist_rows), (Show, show_rows)):
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(model.__table__.insert(), rows[start:start + batch_size])
+        db.session.commit()
+    refresh_show_counters()
+    bump_versions(*VERSIONED_TABLES)
+    db.session.commit()
+    refresh_venue_directory()
+    _search_fallback.clear()
+    page_cache.clear()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fill the database with synthetic venues, artists and shows.')
+    parser.add_argument('--venues', type=int, default=100)
+    parser.add_argument('--artists', type=int, default=200)
+    parser.add_argument('--shows', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        seed_database(args.venues, args.artists, args.shows, seed=args.seed)
+    print('Seeded {} venues, {} artists and {} shows.'.format(args.venues, args.artists, args.shows))
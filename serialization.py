@@ -0,0 +1,29 @@
+import json
+from datetime import date, datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+#----------------------------------------------------------------------------#
+# JSON encoding for the API.
+#
+# orjson is used when installed; it serializes datetimes natively and is
+# several times faster than the standard library. Otherwise fall back to a
+# compact json.dumps. Both return bytes.
+#----------------------------------------------------------------------------#
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError('{!r} is not JSON serializable'.format(value))
+
+
+if orjson is not None:
+    def dumps(value):
+        return orjson.dumps(value, default=_default)
+else:
+    def dumps(value):
+        return json.dumps(value, default=_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
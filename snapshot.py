@@ -0,0 +1,104 @@
+import time
+import logging
+import threading
+
+#----------------------------------------------------------------------------#
+# Background snapshots.
+#
+# A Snapshot holds the latest result of an expensive computation, rebuilt by
+# a daemon thread every `interval` seconds and soon after refresh() is
+# called. Readers never wait on a build: until the first one finishes they
+# get `default`. Each worker process keeps its own snapshot, so a write only
+# wakes the worker that handled it; the others catch up on their interval.
+# An `inline` snapshot, for a database other threads cannot reach (in-memory
+# SQLite), has no thread: get() rebuilds it once it is `interval` seconds old
+# or refresh() was called.
+#
+# A BackgroundTask is the same wake and coalesce loop without the interval:
+# its task runs `delay` seconds after trigger(), once for a whole burst of
+# triggers, and again if triggered while it runs.
+#----------------------------------------------------------------------------#
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot(object):
+
+    def __init__(self, build, interval, default=None, inline=False):
+        self.build = build
+        self.interval = interval
+        self.value = default
+        self.inline = inline
+        self._built_at = None
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.inline:
+            if self._built_at is None or time.time() - self._built_at >= self.interval:
+                self._built_at = time.time()
+                self._rebuild()
+            return self.value
+        # The thread starts on first use, so CLI commands and migrations
+        # importing the app never spawn it.
+        if self._thread is None:
+            self.start()
+        return self.value
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='snapshot', daemon=True)
+                self._thread.start()
+
+    def refresh(self):
+        # Writes made while a build is running coalesce into one more build.
+        if self.inline:
+            self._built_at = None
+        self._wake.set()
+
+    def _rebuild(self):
+        try:
+            self.value = self.build()
+        except Exception:
+            logger.exception('Rebuilding snapshot failed; keeping the previous one')
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            self._rebuild()
+            self._wake.wait(self.interval)
+
+
+class BackgroundTask(object):
+
+    def __init__(self, task, delay):
+        self.task = task
+        self.delay = delay
+        self.pending = False
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def trigger(self):
+        with self._lock:
+            self.pending = True
+            self._wake.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='background-task', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.delay)
+            with self._lock:
+                self._wake.clear()
+            try:
+                self.task()
+            except Exception:
+                logger.exception('Background task failed')
+            with self._lock:
+                # Still pending if triggered again while the task ran.
+                self.pending = self._wake.is_set()
@@ -0,0 +1,118 @@
+import os
+import unittest
+from datetime import datetime
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from sqlalchemy import event
+
+import geo
+from app import app, db, venue_detail, Venue, Show
+from seed import seed_database
+
+
+class ApiDetailTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        seed_database(5, 5, 60)
+        self.client = app.test_client()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.record)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.record)
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def get(self, path):
+        del self.statements[:]
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_full_payload_matches_the_detail_page(self):
+        expected = venue_detail(1)
+        data = self.get('/api/v1/venues/1')
+        self.assertEqual(list(data), list(expected))
+        self.assertEqual(data['upcoming_shows_count'], expected['upcoming_shows_count'])
+        self.assertEqual([show['artist_id'] for show in data['past_shows']],
+                         [show['artist_id'] for show in expected['past_shows']])
+
+    def test_sparse_fieldset_reads_only_the_requested_columns(self):
+        name = db.session.execute('SELECT name FROM artists WHERE id = 2').scalar()
+        self.assertEqual(self.get('/api/v1/artists/2?fields=name'), {'name': name})
+        self.assertEqual(len(self.statements), 1)
+        self.assertNotIn('shows', self.statements[0])
+        self.assertNotIn('seeking_description', self.statements[0])
+
+    def test_show_counts_are_counted_not_loaded(self):
+        expected = venue_detail(3)
+        data = self.get('/api/v1/venues/3?fields=upcoming_shows_count,past_shows_count')
+        self.assertEqual(data, {'upcoming_shows_count': expected['upcoming_shows_count'],
+                                'past_shows_count': expected['past_shows_count']})
+        self.assertEqual(len(self.statements), 2)
+        self.assertNotIn('artists', self.statements[1])
+
+    def test_unknown_field_and_missing_row(self):
+        self.assertEqual(self.client.get('/api/v1/venues/1?fields=bogus').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/venues/999?fields=name').status_code, 404)
+
+
+class NearbyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        seed_database(80, 20, 300)
+        self.client = app.test_client()
+        # Midtown Manhattan; the seeded venues are scattered around city centroids.
+        self.point = {'lat': 40.75, 'lon': -73.99}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def within(self, radius_km):
+        # Venue id -> distance for every venue within the radius, by brute force.
+        distances = {venue.id: geo.distance_km(self.point['lat'], self.point['lon'], venue.latitude, venue.longitude)
+                     for venue in Venue.query.filter(Venue.latitude.isnot(None))}
+        return {id: distance for id, distance in distances.items() if distance <= radius_km}
+
+    def get(self, path, **args):
+        response = self.client.get(path, query_string=dict(self.point, **args))
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()['data']
+
+    def test_nearest_venues_first(self):
+        within = self.within(50)
+        self.assertGreater(len(within), 5)
+        data = self.get('/api/v1/venues/near', radius=50, limit=5)
+        self.assertEqual([venue['id'] for venue in data], sorted(within, key=lambda id: (within[id], id))[:5])
+        for venue in data:
+            self.assertAlmostEqual(venue['distance_km'], within[venue['id']], places=2)
+
+    def test_upcoming_shows_near_a_point(self):
+        within = self.within(50)
+        expected = Show.query.filter(Show.venue_id.in_(within), Show.start_time > datetime.now()).count()
+        self.assertGreater(expected, 0)
+        data = self.get('/api/v1/shows/near', radius=50, limit=500)
+        self.assertEqual(len(data), expected)
+        self.assertTrue(all(show['venue_id'] in within for show in data))
+        self.assertEqual([show['start_time'] for show in data], sorted(show['start_time'] for show in data))
+
+    def test_bad_coordinates(self):
+        for args in ({'lat': 91, 'lon': 0}, {'lat': 'north', 'lon': 0}, {'lon': 0},
+                     {'lat': 0, 'lon': 0, 'radius': 100000}):
+            self.assertEqual(self.client.get('/api/v1/venues/near', query_string=args).status_code, 400)
+            self.assertEqual(self.client.get('/api/v1/shows/near', query_string=args).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
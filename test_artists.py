@@ -0,0 +1,98 @@
+import os
+import base64
+import unittest
+from datetime import datetime
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from sqlalchemy import event
+
+from app import app, db, artist_list_page, artist_detail, _encode_cursor, _decode_cursor, Artist, Show, Venue
+from seed import seed_database
+
+
+class ArtistPagingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        seed_database(5, 23, 0)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_cursor_round_trip(self):
+        keys = [Show.start_time, Show.id]
+        cursor = _encode_cursor([datetime(2030, 1, 2, 20), 7])
+        self.assertEqual(_decode_cursor(cursor, keys), [datetime(2030, 1, 2, 20), 7])
+
+    def test_malformed_cursor_is_ignored(self):
+        self.assertIsNone(_decode_cursor('not a cursor', [Artist.id]))
+        self.assertIsNone(_decode_cursor(_encode_cursor([1, 2]), [Artist.id]))
+        self.assertIsNone(_decode_cursor(_encode_cursor([{}, 1]), [Artist.name, Artist.id]))
+        self.assertIsNone(_decode_cursor(_encode_cursor([['a'], 1]), [Artist.name, Artist.id]))
+        self.assertIsNone(_decode_cursor(base64.urlsafe_b64encode(b'{"a": 1}').decode(), [Artist.id]))
+        self.assertEqual(artist_list_page(after='garbage', limit=5)['items'],
+                         artist_list_page(limit=5)['items'])
+        self.assertEqual(artist_list_page(after=_encode_cursor([{}, 1]), limit=5)['items'],
+                         artist_list_page(limit=5)['items'])
+
+    def test_pages_forward_and_back(self):
+        pages, page = [], artist_list_page(limit=5)
+        self.assertIsNone(page['prev_cursor'])
+        while True:
+            pages.append(page)
+            if page['next_cursor'] is None:
+                break
+            page = artist_list_page(after=page['next_cursor'], limit=5)
+        ids = [item['id'] for page in pages for item in page['items']]
+        expected = [row.id for row in Artist.query.order_by(Artist.name, Artist.id)]
+        self.assertEqual(ids, expected)
+        self.assertEqual([len(page['items']) for page in pages], [5, 5, 5, 5, 3])
+
+        for previous, page in zip(reversed(pages[:-1]), reversed(pages[1:])):
+            self.assertEqual(artist_list_page(before=page['prev_cursor'], limit=5)['items'], previous['items'])
+        self.assertIsNone(artist_list_page(before=pages[1]['prev_cursor'], limit=5)['prev_cursor'])
+
+
+class ArtistDetailTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        seed_database(10, 10, 200)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_one_query_loads_the_artist_and_its_shows(self):
+        statements = []
+
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        artist_id = db.session.query(Show.artist_id).group_by(Show.artist_id) \
+            .order_by(db.func.count(Show.id).desc()).first()[0]
+        db.session.expire_all()
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        try:
+            data = artist_detail(artist_id)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count_statement)
+        self.assertEqual(len(statements), 1)
+
+        now = datetime.now()
+        shows = Show.query.filter_by(artist_id=artist_id)
+        self.assertEqual(data['upcoming_shows_count'], shows.filter(Show.start_time > now).count())
+        self.assertEqual(data['past_shows_count'], shows.filter(Show.start_time <= now).count())
+        names = dict(db.session.query(Venue.id, Venue.name))
+        for show in data['past_shows'] + data['upcoming_shows']:
+            self.assertEqual(show['venue_name'], names[show['venue_id']])
+
+
+if __name__ == '__main__':
+    unittest.main()
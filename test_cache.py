@@ -0,0 +1,81 @@
+import os
+import time
+import unittest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from flask import g, session
+
+from app import app, replicas
+from replicas import STICKY_KEY
+from cache import LRUCache, NullCache
+
+
+class LastInvalidatedTestCase(unittest.TestCase):
+
+    def test_lru_cache_records_invalidations(self):
+        cache = LRUCache()
+        self.assertEqual(cache.last_invalidated(), 0.0)
+        before = time.time()
+        cache.invalidate('venue:1')
+        self.assertGreaterEqual(cache.last_invalidated(), before)
+
+    def test_null_cache_never_invalidates(self):
+        cache = NullCache()
+        cache.invalidate('venue:1')
+        self.assertEqual(cache.last_invalidated(), 0.0)
+
+
+class MayBeStaleTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.test_request_context('/venues/1')
+        self.context.push()
+        self.last_write = replicas.last_write
+        replicas.last_write = 0.0
+
+    def tearDown(self):
+        replicas.last_write = self.last_write
+        self.context.pop()
+
+    def test_primary_reads_are_never_stale(self):
+        self.assertFalse(replicas.may_be_stale(time.time))
+
+    def test_replica_read_after_another_workers_write(self):
+        g.db_replica = object()
+        self.assertFalse(replicas.may_be_stale(lambda: 0.0))
+        self.assertTrue(replicas.may_be_stale(time.time))
+        long_ago = time.time() - replicas.sticky_seconds - 1
+        self.assertFalse(replicas.may_be_stale(lambda: long_ago))
+
+    def test_replica_read_after_this_workers_write(self):
+        g.db_replica = object()
+        replicas.last_write = time.time()
+        self.assertTrue(replicas.may_be_stale())
+
+
+class PickReplicaTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.engines, self.weights = replicas.engines, replicas.weights
+        replicas.engines, replicas.weights = [object(), object()], [0, 1]
+
+    def tearDown(self):
+        replicas.engines, replicas.weights = self.engines, self.weights
+
+    def test_read_endpoints_pick_a_replica_by_weight(self):
+        with app.test_request_context('/venues/1'):
+            self.assertEqual(replicas.pick(), 1)
+
+    def test_other_endpoints_read_from_the_primary(self):
+        with app.test_request_context('/venues/create'):
+            self.assertIsNone(replicas.pick())
+
+    def test_recent_writers_read_from_the_primary(self):
+        with app.test_request_context('/venues/1'):
+            session[STICKY_KEY] = time.time() + replicas.sticky_seconds
+            self.assertIsNone(replicas.pick())
+
+
+if __name__ == '__main__':
+    unittest.main()
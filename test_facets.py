@@ -0,0 +1,79 @@
+import os
+import unittest
+from collections import Counter
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import app, db, genre_facets, search_results, venue_directory, artist_list_page, Venue, Artist
+from seed import seed_database
+
+
+class GenreFacetTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        seed_database(40, 40, 0)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def expected(self, model, selected=()):
+        counts = Counter()
+        for genres, in db.session.query(model.genres):
+            if set(selected) <= set(genres):
+                counts.update(genres)
+        return counts
+
+    def counts(self, facets):
+        return {facet['genre']: facet['count'] for facet in facets}
+
+    def common_genres(self, model):
+        return [genre for genre, _ in self.expected(model).most_common(2)]
+
+    def test_listing_facets_count_every_genre(self):
+        for model in (Venue, Artist):
+            facets = genre_facets(model, ())
+            self.assertEqual(self.counts(facets), self.expected(model))
+            self.assertEqual([facet['count'] for facet in facets],
+                             sorted((facet['count'] for facet in facets), reverse=True))
+
+    def test_selected_genres_narrow_the_facets(self):
+        for model in (Venue, Artist):
+            genre = self.common_genres(model)[0]
+            facets = genre_facets(model, [genre])
+            self.assertEqual(self.counts(facets), self.expected(model, [genre]))
+            self.assertEqual([facet['genre'] for facet in facets if facet['selected']], [genre])
+
+    def test_listings_filter_by_every_selected_genre(self):
+        genres = self.common_genres(Venue)
+        listed = [venue['id'] for area in venue_directory(genres) for venue in area['venues']]
+        matching = [venue.id for venue in Venue.query if set(genres) <= set(venue.genres)]
+        self.assertEqual(sorted(listed), sorted(matching))
+
+        genre = self.common_genres(Artist)[0]
+        listed = [artist['id'] for artist in artist_list_page(limit=100, genres=[genre])['items']]
+        matching = [artist.id for artist in Artist.query if genre in artist.genres]
+        self.assertEqual(sorted(listed), sorted(matching))
+
+    def test_pages_show_only_the_selected_genre(self):
+        genre = self.common_genres(Artist)[0]
+        data = app.test_client().get('/artists', query_string={'genre': genre, 'limit': 100}).data.decode()
+        for artist in Artist.query:
+            if genre in artist.genres:
+                self.assertIn(artist.name, data)
+            else:
+                self.assertNotIn(artist.name + '<', data)
+
+    def test_search_facets_cover_the_matches(self):
+        results = search_results(Venue, 'hall')
+        matches = Venue.query.filter(Venue.name.ilike('%hall%')).all()
+        self.assertEqual(results['count'], len(matches))
+        self.assertEqual(self.counts(results['facets']),
+                         Counter(genre for venue in matches for genre in venue.genres))
+
+
+if __name__ == '__main__':
+    unittest.main()
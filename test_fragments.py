@@ -0,0 +1,81 @@
+import os
+import unittest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from jinja2 import Environment
+
+from app import app, db, page_cache, entities_changed, Artist, Show
+from cache import LRUCache
+from fragments import FragmentCacheExtension
+from seed import seed_database
+
+
+class FragmentCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.environment = Environment(extensions=[FragmentCacheExtension])
+        self.environment.fragment_cache = LRUCache()
+        self.template = self.environment.from_string(
+            "{% cache 'row', id, version %}<p>{{ render() }}</p>{% endcache %}")
+        self.renders = 0
+
+    def render(self, id, version):
+        def render():
+            self.renders += 1
+            return '%d@%d' % (id, version)
+        return self.template.render(id=id, version=version, render=render)
+
+    def test_same_key_renders_once(self):
+        self.assertEqual(self.render(1, 1), '<p>1@1</p>')
+        self.assertEqual(self.render(1, 1), '<p>1@1</p>')
+        self.assertEqual(self.renders, 1)
+
+    def test_new_version_or_row_misses(self):
+        self.render(1, 1)
+        self.assertEqual(self.render(1, 2), '<p>1@2</p>')
+        self.assertEqual(self.render(2, 1), '<p>2@1</p>')
+        self.assertEqual(self.renders, 3)
+
+    def test_no_cache_renders_every_time(self):
+        self.environment.fragment_cache = None
+        self.render(1, 1)
+        self.render(1, 1)
+        self.assertEqual(self.renders, 2)
+
+
+class ShowCardTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        seed_database(5, 5, 40)
+        app.jinja_env.fragment_cache.clear()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_cards_are_reused_across_renders(self):
+        first = self.client.get('/shows?limit=20').data
+        cached = len(app.jinja_env.fragment_cache)
+        self.assertEqual(cached, 20)
+        page_cache.clear()
+        self.assertEqual(self.client.get('/shows?limit=20').data, first)
+        self.assertEqual(len(app.jinja_env.fragment_cache), cached)
+
+    def test_card_follows_an_artist_update(self):
+        self.client.get('/shows?limit=500')
+        artist = Artist.query.get(Show.query.first().artist_id)
+        old_name, artist.name = artist.name, 'Renamed Artist'
+        db.session.commit()
+        entities_changed('artists', 'artist:%d' % artist.id)
+        data = self.client.get('/shows?limit=500').data.decode()
+        self.assertIn('Renamed Artist', data)
+        self.assertNotIn(old_name + '<', data)
+
+
+if __name__ == '__main__':
+    unittest.main()
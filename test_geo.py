@@ -0,0 +1,44 @@
+import math
+import random
+import unittest
+
+import geo
+
+
+class GeoTestCase(unittest.TestCase):
+
+    def test_encode(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_distance(self):
+        self.assertAlmostEqual(geo.distance_km(40.7128, -74.0060, 34.0522, -118.2437), 3936, delta=5)
+        self.assertIsNone(geo.distance_km(None, 0, 0, 0))
+
+    def test_covering_prefixes_contain_every_point_in_the_radius(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            latitude, longitude = rng.uniform(-70, 70), rng.uniform(-180, 180)
+            radius_km = rng.choice([0.5, 5, 50, 500])
+            prefixes = geo.covering_prefixes(latitude, longitude, radius_km)
+            for _ in range(20):
+                # A point at most radius_km away in a random direction.
+                lat = latitude + rng.uniform(-1, 1) * radius_km / 111.2
+                lon = longitude + rng.uniform(-1, 1) * radius_km / 111.2 / max(0.01, math.cos(math.radians(lat)))
+                lon = (lon + 180) % 360 - 180
+                if geo.distance_km(latitude, longitude, lat, lon) > radius_km:
+                    continue
+                hashed = geo.encode(lat, lon)
+                self.assertTrue(any(hashed.startswith(prefix) for prefix in prefixes),
+                                (latitude, longitude, radius_km, lat, lon))
+
+    def test_covering_prefixes_near_a_pole_cover_everything(self):
+        self.assertEqual(geo.covering_prefixes(89.9, 0, 50), [''])
+
+    def test_prefix_range(self):
+        low, high = geo.prefix_range('9q8')
+        self.assertTrue(low <= geo.encode(37.77, -122.42) <= high)
+        self.assertEqual(len(low), geo.PRECISION)
+
+
+if __name__ == '__main__':
+    unittest.main()
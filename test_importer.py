@@ -0,0 +1,105 @@
+import io
+import os
+import unittest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import app, db, bulk_import, Artist, Show, Venue
+from importer import read_rows, validate_row
+
+
+class ValidateRowTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+
+    def tearDown(self):
+        self.context.pop()
+
+    def test_missing_required_field_ignores_form_default(self):
+        values, errors = validate_row('shows', {'venue_id': '1', 'artist_id': '2'})
+        self.assertEqual(errors, {'start_time': ['This field is required.']})
+
+    def test_missing_duration_takes_import_default(self):
+        values, errors = validate_row('shows', {'venue_id': '1', 'artist_id': '2',
+                                                'start_time': '2030-01-01 20:00:00'})
+        self.assertEqual(errors, {})
+        self.assertEqual(values['duration_minutes'], 120)
+
+    def test_unparseable_lines_are_row_errors(self):
+        rows = list(read_rows(io.StringIO('not json\n[1, 2]\n'), 'ndjson'))
+        self.assertEqual([line for line, _ in rows], [1, 2])
+        for _, row in rows:
+            self.assertIn('row', validate_row('artists', row)[1])
+
+    def test_extra_csv_column_is_ignored(self):
+        (line, row), = read_rows(io.StringIO('name,city,state,genres\nA,B,CA,Jazz,extra\n'), 'csv')
+        self.assertEqual(validate_row('artists', row)[1], {})
+
+
+class BulkImportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_bad_line_does_not_drop_the_batch(self):
+        source = io.StringIO('{"name": "A3", "city": "SF", "state": "CA", "genres": ["Jazz"]}\nnot json\n')
+        report = bulk_import('artists', read_rows(source, 'ndjson'))
+        self.assertEqual(report['inserted'], 1)
+        self.assertEqual([error['line'] for error in report['errors']], [2])
+        self.assertEqual([artist.name for artist in Artist.query.all()], ['A3'])
+
+    def test_show_without_start_time_is_rejected(self):
+        db.session.add_all([Venue(name='V', city='SF', state='CA', address='x'),
+                            Artist(name='A', city='SF', state='CA')])
+        db.session.commit()
+        report = bulk_import('shows', read_rows(io.StringIO('venue_id,artist_id\n1,1\n'), 'csv'))
+        self.assertEqual(report['inserted'], 0)
+        self.assertEqual(report['errors'][0]['errors'], {'start_time': ['This field is required.']})
+        self.assertEqual(Show.query.count(), 0)
+
+
+class ImportUploadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def upload(self, kind, data, filename):
+        response = self.client.post('/import/' + kind, data={'file': (io.BytesIO(data), filename)},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_quoted_newlines_stay_in_their_field(self):
+        report = self.upload('venues', b'name,city,state,address,genres\r\n'
+                                       b'"Two\r\nLine Hall",SF,CA,x,Jazz\r\nNext Hall,SF,CA,y,Jazz\r\n', 'v.csv')
+        self.assertEqual((report['inserted'], report['errors']), (2, []))
+        self.assertEqual(sorted(venue.name for venue in Venue.query), ['Next Hall', 'Two\r\nLine Hall'])
+
+    def test_text_that_is_not_utf8_is_reported(self):
+        report = self.upload('artists', b'{"name": "A1", "city": "SF", "state": "CA", "genres": ["Jazz"]}\n'
+                                        b'{"name": "Caf\xe9", "city": "SF", "state": "CA"}\n', 'a.ndjson')
+        self.assertEqual(report['inserted'], 1)
+        (error,) = report['errors']
+        self.assertEqual(error['line'], 2)
+        self.assertIn('UTF-8', error['errors']['row'][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from intervals import IntervalIndex
+
+
+class IntervalIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.index = IntervalIndex()
+        self.index.add('venue', 10, 20, 'a')
+        self.index.add('venue', 30, 35, 'b')
+
+    def test_overlap(self):
+        self.assertEqual(self.index.first_overlap('venue', 15, 16), 'a')
+        self.assertEqual(self.index.first_overlap('venue', 0, 40), 'a')
+        self.assertEqual(self.index.first_overlap('venue', 34, 50), 'b')
+
+    def test_intervals_are_half_open(self):
+        self.assertIsNone(self.index.first_overlap('venue', 20, 30))
+        self.assertIsNone(self.index.first_overlap('venue', 0, 10))
+
+    def test_keys_are_separate(self):
+        self.assertIsNone(self.index.first_overlap('artist', 15, 16))
+
+    def test_long_interval_is_found_from_far_behind(self):
+        self.index.add('venue', 0, 100, 'long')
+        self.assertEqual(self.index.first_overlap('venue', 90, 95), 'long')
+
+    def test_matches_brute_force(self):
+        import random
+        rng = random.Random(0)
+        index, intervals = IntervalIndex(), []
+        for label in range(200):
+            start = rng.randint(0, 1000)
+            end = start + rng.randint(1, 30)
+            index.add('venue', start, end, label)
+            intervals.append((start, end))
+        for _ in range(500):
+            start = rng.randint(0, 1000)
+            end = start + rng.randint(1, 30)
+            found = index.first_overlap('venue', start, end)
+            overlapping = any(other_start < end and other_end > start for other_start, other_end in intervals)
+            self.assertEqual(found is not None, overlapping)
+            if found is not None:
+                self.assertTrue(intervals[found][0] < end and intervals[found][1] > start)
+
+
+if __name__ == '__main__':
+    unittest.main()
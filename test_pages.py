@@ -0,0 +1,139 @@
+import os
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import app, db, page_cache, version_query, bump_versions, show_feed_page, Artist, Venue
+from seed import seed_database
+
+
+class PageCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+        db.session.add(Venue(name='Old Name', city='SF', state='CA', address='x', genres=['Jazz']))
+        db.session.commit()
+        page_cache.clear()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        page_cache.clear()
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_cached_page_is_not_served_under_a_newer_etag(self):
+        first = self.client.get('/venues/1')
+        self.assertIn(b'Old Name', first.data)
+
+        # A write this worker's cache has not been told about.
+        db.session.query(Venue).filter(Venue.id == 1).update(
+            {Venue.name: 'New Name', Venue.updated_at: datetime.now() + timedelta(seconds=1)})
+        db.session.commit()
+
+        second = self.client.get('/venues/1')
+        self.assertNotEqual(second.headers['ETag'], first.headers['ETag'])
+        self.assertIn(b'New Name', second.data)
+        third = self.client.get('/venues/1', headers={'If-None-Match': second.headers['ETag']})
+        self.assertEqual(third.status_code, 304)
+
+    def test_unchanged_page_is_served_from_the_cache(self):
+        self.client.get('/venues/1')
+        # Same version, so the cached page stands until it is invalidated.
+        db.session.execute('UPDATE venues SET name = :name', {'name': 'New Name'})
+        db.session.commit()
+        self.assertIn(b'Old Name', self.client.get('/venues/1').data)
+
+
+class ListingValidatorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+        page_cache.clear()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        page_cache.clear()
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_listing_version_does_not_read_the_listed_table(self):
+        statement = str(version_query(Artist))
+        self.assertIn('table_versions', statement)
+        self.assertNotIn('artists.', statement)
+
+    def test_listing_etag_changes_with_writes(self):
+        first = self.client.get('/artists')
+        self.assertEqual(self.client.get('/artists', headers={'If-None-Match': first.headers['ETag']}).status_code, 304)
+        form = dict(name='New Artist', city='SF', state='CA', phone='', genres='Jazz', image_link='',
+                    website='', facebook_link='', seeking_description='')
+        self.client.post('/artists/create', data=form)
+        second = self.client.get('/artists', headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(second.status_code, 200)
+        self.assertIn(b'New Artist', second.data)
+
+
+class OtherProcessWriteTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        seed_database(3, 3, 20)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        page_cache.clear()
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_cached_show_feed_misses_after_a_write_this_cache_did_not_see(self):
+        self.client.get('/shows')
+        artist_id = show_feed_page()['items'][0]['artist_id']
+        # As a CLI command or another worker would: the write and the version
+        # bump reach the database, the invalidation never reaches this cache.
+        with mock.patch.object(page_cache, 'invalidate'), mock.patch.object(page_cache, 'clear'):
+            db.session.execute('UPDATE artists SET name = :name, updated_at = :now WHERE id = :id',
+                               {'name': 'Renamed Elsewhere', 'now': datetime.now(), 'id': artist_id})
+            bump_versions('artists')
+            db.session.commit()
+        self.assertIn(b'Renamed Elsewhere', self.client.get('/shows').data)
+
+
+class HomePageTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_highlights_follow_writes_on_an_in_memory_database(self):
+        self.client.post('/venues/create', data=dict(name='Highlight Hall', city='SF', state='CA', address='x',
+                                                     phone='', genres='Jazz', image_link='', website='',
+                                                     facebook_link='', seeking_description=''))
+        self.client.post('/artists/create', data=dict(name='Highlight Band', city='SF', state='CA', phone='',
+                                                      genres='Jazz', image_link='', website='',
+                                                      facebook_link='', seeking_description=''))
+        start = datetime.now() + timedelta(days=2)
+        self.client.post('/shows/create', data={'venue_id': '1', 'artist_id': '1',
+                                                'start_time': start.strftime('%Y-%m-%d %H:%M:%S')})
+        data = self.client.get('/').data
+        self.assertIn(b'Upcoming highlights', data)
+        self.assertIn(b'Highlight Band', data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import unittest
+from datetime import datetime
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import event
+
+from app import app, db, search_entities, search_results, Venue, Artist, Show
+from seed import seed_database
+from search_index import TrigramIndex
+
+
+class TrigramIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.index = TrigramIndex()
+        self.index.add(1, 'The Musical Hop', 'San Francisco', 'CA', 'Jazz Reggae')
+        self.index.add(2, 'Park Square Live Music & Coffee', 'San Francisco', 'CA', 'Rock n Roll')
+        self.index.add(3, 'The Dueling Pianos Bar', 'New York', 'NY', 'Classical')
+
+    def test_substring_matches_are_case_insensitive(self):
+        self.assertEqual(self.index.search('hOP'), [1])
+        self.assertEqual(sorted(self.index.search('Music')), [1, 2])
+        self.assertEqual(self.index.search('zz'), [1])
+        self.assertEqual(self.index.search('opera'), [])
+
+    def test_other_fields_are_searched(self):
+        self.assertEqual(sorted(self.index.search('san francisco')), [1, 2])
+        self.assertEqual(self.index.search('classical'), [3])
+
+    def test_closest_name_ranks_first(self):
+        self.index.add(4, 'Music', 'Austin', 'TX', '')
+        self.assertEqual(self.index.search('music')[0], 4)
+
+
+class SearchEntitiesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+        db.session.add_all([
+            Venue(name='The Musical Hop', city='San Francisco', state='CA', address='x', genres=['Jazz']),
+            Venue(name='Hop Scotch', city='Austin', state='TX', address='x', genres=['Folk']),
+            Artist(name='Guns N Petals', city='San Francisco', state='CA', genres=['Rock n Roll']),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def names(self, model, term):
+        return [hit.name for hit in search_entities(model, term)[0]]
+
+    def test_matches_name_city_state_and_genres(self):
+        self.assertEqual(self.names(Venue, 'hop'), ['Hop Scotch', 'The Musical Hop'])
+        self.assertEqual(self.names(Venue, 'austin'), ['Hop Scotch'])
+        self.assertEqual(self.names(Venue, 'JAZZ'), ['The Musical Hop'])
+        self.assertEqual(self.names(Artist, 'roll'), ['Guns N Petals'])
+
+    def test_writes_reach_the_fallback_index(self):
+        self.assertEqual(self.names(Artist, 'petal'), ['Guns N Petals'])
+        db.session.add(Artist(name='Petal Pushers', city='Austin', state='TX', genres=['Folk']))
+        db.session.commit()
+        self.assertEqual(self.names(Artist, 'petal'), ['Petal Pushers', 'Guns N Petals'])
+
+
+class SearchResultsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        seed_database(60, 20, 300)
+        self.limit = app.config['SEARCH_RESULT_LIMIT']
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.count_statement)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.count_statement)
+        app.config['SEARCH_RESULT_LIMIT'] = self.limit
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def statements_for(self, term):
+        del self.statements[:]
+        search_results(Venue, term)
+        return len(self.statements)
+
+    def test_upcoming_show_counts_match_the_shows(self):
+        upcoming = dict(db.session.query(Show.venue_id, db.func.count(Show.id))
+                        .filter(Show.start_time > datetime.now()).group_by(Show.venue_id))
+        results = search_results(Venue, 'the')
+        self.assertEqual(results['count'], 60)
+        for hit in results['data']:
+            self.assertEqual(hit['num_upcoming_shows'], upcoming.get(hit['id'], 0))
+
+    def test_results_are_capped_with_the_total_count(self):
+        app.config['SEARCH_RESULT_LIMIT'] = 10
+        results = search_results(Venue, 'the')
+        self.assertEqual(len(results['data']), 10)
+        self.assertEqual(results['count'], 60)
+        self.assertFalse(results['estimated'])
+
+    def test_statement_count_does_not_grow_with_matches(self):
+        few, many = search_results(Venue, '5')['count'], search_results(Venue, 'the')['count']
+        self.assertTrue(0 < few < many / 2)
+        self.assertEqual(self.statements_for('5'), self.statements_for('the'))
+
+
+class MigrationTestCase(unittest.TestCase):
+
+    def test_search_index_migration_is_on_the_single_head(self):
+        config = Config()
+        config.set_main_option('script_location', os.path.join(os.path.dirname(__file__) or '.', 'migrations'))
+        script = ScriptDirectory.from_config(config)
+        heads = script.get_heads()
+        self.assertEqual(len(heads), 1)
+        revisions = [revision.revision for revision in script.walk_revisions()]
+        self.assertIn('ec94f9574d88', revisions)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import unittest
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import app, db, naive_local, constraint_conflicts, Artist, Show, Venue
+
+
+class CreateShowTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+        db.session.add_all([Venue(name='V', city='SF', state='CA', address='x'),
+                            Venue(name='W', city='SF', state='CA', address='x'),
+                            Artist(name='A', city='SF', state='CA'),
+                            Artist(name='B', city='SF', state='CA')])
+        db.session.commit()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_naive_local_converts_offsets(self):
+        moment = datetime(2031, 5, 21, 21, 30, tzinfo=timezone.utc)
+        self.assertEqual(naive_local(moment), moment.astimezone().replace(tzinfo=None))
+        self.assertEqual(naive_local(datetime(2031, 5, 21)), datetime(2031, 5, 21))
+
+    def test_start_time_with_offset_is_listed(self):
+        start = (datetime.now(timezone.utc) + timedelta(days=30)).replace(microsecond=0)
+        response = self.client.post('/shows/create', data={
+            'venue_id': '1', 'artist_id': '1', 'start_time': start.strftime('%Y-%m-%dT%H:%M:%SZ')})
+        self.assertIn(b'Show was successfully listed!', response.data)
+        show = Show.query.one()
+        self.assertEqual(show.start_time, naive_local(start))
+        self.assertEqual(Venue.query.get(1).upcoming_shows_count, 1)
+
+    def create(self, venue_id, artist_id, start, minutes=120):
+        return self.client.post('/shows/create', data={
+            'venue_id': str(venue_id), 'artist_id': str(artist_id),
+            'start_time': start.strftime('%Y-%m-%d %H:%M:%S'), 'duration_minutes': str(minutes)}).data
+
+    def test_overlapping_show_at_the_same_venue_is_rejected(self):
+        start = datetime(2031, 5, 21, 20, 0)
+        self.assertIn(b'Show was successfully listed!', self.create(1, 1, start))
+        response = self.create(1, 2, start + timedelta(minutes=90))
+        self.assertIn(b'Show could not be listed.', response)
+        self.assertIn(b'The venue is already booked at that time', response)
+        self.assertEqual(Show.query.count(), 1)
+
+    def test_overlapping_show_by_the_same_artist_is_rejected(self):
+        start = datetime(2031, 5, 21, 20, 0)
+        self.assertIn(b'Show was successfully listed!', self.create(1, 1, start))
+        response = self.create(2, 1, start - timedelta(minutes=60))
+        self.assertIn(b'The artist is already booked at that time', response)
+        self.assertEqual(Show.query.count(), 1)
+
+    def test_back_to_back_shows_are_listed(self):
+        start = datetime(2031, 5, 21, 20, 0)
+        self.assertIn(b'Show was successfully listed!', self.create(1, 1, start, 60))
+        self.assertIn(b'Show was successfully listed!', self.create(1, 1, start + timedelta(minutes=60)))
+        self.assertEqual(Show.query.count(), 2)
+
+
+class ConstraintConflictsTestCase(unittest.TestCase):
+
+    class Error(object):
+        # The parts of a psycopg2 error constraint_conflicts() reads.
+        def __init__(self, constraint_name):
+            self.orig = type('orig', (), {'diag': type('diag', (), {'constraint_name': constraint_name})})()
+
+    def test_exclusion_constraints_are_conflicts(self):
+        self.assertEqual(constraint_conflicts(self.Error('ex_shows_venue_booking')),
+                         {'venue_id': ['The venue is already booked at that time.']})
+        self.assertEqual(constraint_conflicts(self.Error('ex_shows_artist_booking')),
+                         {'artist_id': ['The artist is already booked at that time.']})
+
+    def test_other_integrity_errors_are_not(self):
+        self.assertEqual(constraint_conflicts(self.Error('shows_venue_id_fkey')), {})
+        self.assertEqual(constraint_conflicts(type('error', (), {'orig': ValueError()})()), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
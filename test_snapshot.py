@@ -0,0 +1,77 @@
+import time
+import threading
+import unittest
+
+from snapshot import BackgroundTask, Snapshot
+
+
+class BackgroundTaskTestCase(unittest.TestCase):
+
+    def wait_until_done(self, task):
+        deadline = time.time() + 5
+        while task.pending and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(task.pending)
+
+    def test_burst_of_triggers_runs_once(self):
+        runs = []
+        task = BackgroundTask(lambda: runs.append(1), 0.05)
+        for _ in range(10):
+            task.trigger()
+        self.assertTrue(task.pending)
+        self.wait_until_done(task)
+        self.assertEqual(len(runs), 1)
+
+    def test_trigger_while_running_runs_again(self):
+        started, release, runs = threading.Event(), threading.Event(), []
+
+        def run():
+            runs.append(1)
+            if len(runs) == 1:
+                started.set()
+                release.wait(5)
+
+        task = BackgroundTask(run, 0)
+        task.trigger()
+        started.wait(5)
+        task.trigger()
+        task.trigger()
+        release.set()
+        self.wait_until_done(task)
+        self.assertEqual(len(runs), 2)
+
+    def test_failing_task_is_not_fatal(self):
+        runs = []
+
+        def run():
+            runs.append(1)
+            raise RuntimeError('boom')
+
+        task = BackgroundTask(run, 0)
+        task.trigger()
+        self.wait_until_done(task)
+        task.trigger()
+        self.wait_until_done(task)
+        self.assertEqual(len(runs), 2)
+
+
+class InlineSnapshotTestCase(unittest.TestCase):
+
+    def test_builds_on_read_without_a_thread(self):
+        builds = []
+        snapshot = Snapshot(lambda: builds.append(1) or len(builds), 60, inline=True)
+        self.assertEqual(snapshot.get(), 1)
+        self.assertEqual(snapshot.get(), 1)
+        snapshot.refresh()
+        self.assertEqual(snapshot.get(), 2)
+        self.assertIsNone(snapshot._thread)
+
+    def test_rebuilds_after_the_interval(self):
+        builds = []
+        snapshot = Snapshot(lambda: builds.append(1) or len(builds), 0, inline=True)
+        snapshot.get()
+        self.assertEqual(snapshot.get(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
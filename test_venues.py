@@ -0,0 +1,186 @@
+import os
+import unittest
+from datetime import datetime
+from unittest import mock
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from sqlalchemy import event
+
+import app as fyyur
+from app import app, db, Venue, Artist, Show, VenueDirectoryEntry, refresh_venue_directory, venue_detail
+from seed import seed_database
+
+
+class VenueListingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        self.client = app.test_client()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.count_statement)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.count_statement)
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def statements_for(self, path):
+        del self.statements[:]
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(self.statements)
+
+    def test_listing_statement_count_does_not_grow_with_venues(self):
+        # The listing used to issue a query per city and per venue.
+        for path in ('/venues', '/venues?genre=Jazz'):
+            seed_database(5, 10, 20)
+            small = self.statements_for(path)
+            seed_database(80, 10, 200)
+            self.assertEqual(self.statements_for(path), small, path)
+
+    def test_listing_groups_every_venue_by_city(self):
+        seed_database(40, 10, 100)
+        data = self.client.get('/venues').data.decode()
+        for name, city in db.session.execute('SELECT name, city FROM venues'):
+            self.assertIn(name, data)
+            self.assertIn(city, data)
+
+
+class DirectoryRefreshTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        seed_database(10, 10, 60)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def directory_counts(self):
+        return {venue['id']: venue['num_upcoming_shows']
+                for entry in VenueDirectoryEntry.query for venue in entry.venues}
+
+    def test_cli_commands_refresh_the_directory_before_exiting(self):
+        db.session.execute('UPDATE venues SET upcoming_shows_count = 99')
+        db.session.commit()
+        refresh_venue_directory()
+        # As on a file or server database, where requests refresh it later.
+        with mock.patch.object(fyyur, 'in_memory_database', return_value=False), \
+                mock.patch.object(fyyur.venue_directory_refresh, 'trigger') as trigger:
+            result = app.test_cli_runner().invoke(args=['rebuild-show-counters'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        trigger.assert_not_called()
+        counts = dict(db.session.query(Venue.id, Venue.upcoming_shows_count))
+        self.assertNotIn(99, counts.values())
+        self.assertEqual(self.directory_counts(), counts)
+
+
+    def test_listing_validators_follow_the_directory(self):
+        client = app.test_client()
+        form = dict(name='Brand New Hall', city='Austin', state='TX', address='1 Main', phone='', genres='Jazz',
+                    image_link='', website='', facebook_link='', seeking_description='')
+        # A write whose directory refresh has not run yet, as seen from a
+        # worker that did not handle it.
+        with mock.patch.object(fyyur, 'in_memory_database', return_value=False), \
+                mock.patch.object(fyyur.venue_directory_refresh, 'trigger'):
+            client.post('/venues/create', data=form)
+        before = client.get('/venues')
+        self.assertNotIn(b'Brand New Hall', before.data)
+
+        refresh_venue_directory()
+        after = client.get('/venues', headers={'If-None-Match': before.headers['ETag']})
+        self.assertEqual(after.status_code, 200)
+        self.assertIn(b'Brand New Hall', after.data)
+
+
+class VenueDetailTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        seed_database(10, 10, 200)
+        self.client = app.test_client()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.count_statement)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.count_statement)
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def show_counts(self):
+        return dict(db.session.query(Show.venue_id, db.func.count(Show.id)).group_by(Show.venue_id))
+
+    def test_statement_count_does_not_grow_with_shows(self):
+        counts = self.show_counts()
+        busiest, quietest = max(counts, key=counts.get), min(counts, key=counts.get)
+        self.assertGreater(counts[busiest], counts[quietest] + 10)
+        issued = []
+        for venue_id in (busiest, quietest):
+            del self.statements[:]
+            self.assertEqual(self.client.get('/venues/%d' % venue_id).status_code, 200)
+            issued.append(len(self.statements))
+        self.assertEqual(issued[0], issued[1])
+
+    def test_shows_are_split_around_now(self):
+        counts = self.show_counts()
+        venue_id = max(counts, key=counts.get)
+        data = venue_detail(venue_id)
+        now = datetime.now()
+        shows = Show.query.filter_by(venue_id=venue_id)
+        self.assertEqual(data['upcoming_shows_count'], shows.filter(Show.start_time > now).count())
+        self.assertEqual(data['past_shows_count'], shows.filter(Show.start_time <= now).count())
+        self.assertEqual(len(data['past_shows']), data['past_shows_count'])
+        names = dict(db.session.query(Artist.id, Artist.name))
+        for show in data['past_shows'] + data['upcoming_shows']:
+            self.assertEqual(show['artist_name'], names[show['artist_id']])
+        self.assertIsNone(venue_detail(9999))
+
+
+class AvailableVenuesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+        db.session.add_all([
+            Venue(name='A Jazz Club', city='SF', state='CA', address='x', genres=['Jazz']),
+            Venue(name='B Rock Club', city='SF', state='CA', address='x', genres=['Jazz', 'Rock']),
+        ])
+        db.session.commit()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def names(self, query):
+        response = self.client.get('/api/v1/venues/available?city=SF&state=CA'
+                                   '&start=2030-01-01T20:00:00Z&end=2030-01-01T22:00:00Z' + query)
+        self.assertEqual(response.status_code, 200)
+        return [venue['name'] for venue in response.get_json()['data']]
+
+    def test_repeated_genre_arguments_rank_matches_first(self):
+        self.assertEqual(self.names(''), ['A Jazz Club', 'B Rock Club'])
+        self.assertEqual(self.names('&genre=Jazz'), ['A Jazz Club', 'B Rock Club'])
+        self.assertEqual(self.names('&genre=Jazz&genre=Rock'), ['B Rock Club', 'A Jazz Club'])
+
+    def test_comma_separated_genres_still_accepted(self):
+        self.assertEqual(self.names('&genres=Jazz,Rock'), ['B Rock Club', 'A Jazz Club'])
+
+
+if __name__ == '__main__':
+    unittest.main()